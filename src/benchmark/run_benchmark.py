@@ -0,0 +1,225 @@
+'''
+Scale benchmark for the generation pipeline.
+
+Every (initial consultants, years) cell of the grid runs main.py's phases in a fresh
+process with its own OUTPUT_DIR, so peak RSS and module-level state are per run.
+The process peak cannot be reset between phases: each phase records the peak so far
+(cumulative_peak_rss_mb) and how much the phase raised it (peak_rss_growth_mb).
+Results are written as JSON and can be compared against a stored baseline:
+
+    python src/benchmark/run_benchmark.py --consultants 100 500 --years 1 3
+    python src/benchmark/run_benchmark.py --save-baseline
+    python src/benchmark/run_benchmark.py --baseline benchmark_results/baseline.json
+'''
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+from config.path_config import benchmark_path
+
+DEFAULT_RESULTS = os.path.join(benchmark_path, 'results.json')
+DEFAULT_BASELINE = os.path.join(benchmark_path, 'baseline.json')
+START_YEAR = 2015
+BENCHMARK_SEED = 20150101
+
+def peak_rss_mb():
+    '''Peak resident set size of this process so far, in MB (None where unsupported).'''
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory = psutil.Process().memory_info()
+        return round(getattr(memory, 'peak_wset', memory.rss) / 2**20, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+def table_row_counts():
+    from sqlalchemy import inspect, text
+    from models.db_model import engine
+    with engine.connect() as connection:
+        return {table: connection.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+                for table in inspect(connection).get_table_names()}
+
+def extract_etl():
+    from etl_service import sqlite_to_snowflake
+    return sqlite_to_snowflake.stage_from_sqlite()
+
+def run_cell(initial_consultants, years):
+    '''Worker side: run every phase once and measure it.'''
+    import main as pipeline
+    from models.db_model import engine
+    from database_generator.utils.random_streams import set_seed
+    from database_generator.utils.instrumentation import instrumentation
+
+    set_seed(BENCHMARK_SEED)
+    instrumentation.attach_engine(engine)
+    end_year = START_YEAR + years - 1
+    phases = pipeline.build_phases(START_YEAR, end_year, initial_consultants) + [('etl_extract', extract_etl)]
+
+    results = []
+    rows_before = {}
+    peak_before = peak_rss_mb()
+    for name, run_phase in phases:
+        start = time.perf_counter()
+        try:
+            with instrumentation.phase(name):
+                run_phase()
+            status = 'ok'
+        except ImportError as e:
+            # Optional dependencies (e.g. the Snowflake connector for the ETL module)
+            status = f'skipped: {e}'
+        seconds = time.perf_counter() - start
+        sql = instrumentation.phases[-1]
+
+        rows_after = table_row_counts()
+        new_rows = {table: count - rows_before.get(table, 0) for table, count in rows_after.items()
+                    if count != rows_before.get(table, 0)}
+        rows_before = rows_after
+        peak_after = peak_rss_mb()
+        results.append({
+            'phase': name,
+            'status': status,
+            'seconds': round(seconds, 3),
+            'cumulative_peak_rss_mb': peak_after,
+            'peak_rss_growth_mb': round(peak_after - peak_before, 1) if peak_after is not None else None,
+            'sql_statements': sql['sql_statements'],
+            'sql_seconds': sql['sql_seconds'],
+            'rows': new_rows,
+            'rows_per_sec': {table: round(count / seconds, 1) for table, count in new_rows.items() if seconds > 0}
+        })
+        peak_before = peak_after
+        print(f"[benchmark] {name}: {seconds:.2f}s", flush=True)
+
+    return {
+        'initial_consultants': initial_consultants,
+        'years': years,
+        'total_seconds': round(sum(phase['seconds'] for phase in results), 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'table_rows': rows_before,
+        'phases': results
+    }
+
+def run_grid(consultant_grid, year_grid, quiet=True):
+    runs = []
+    for initial_consultants in consultant_grid:
+        for years in year_grid:
+            print(f"Benchmarking {initial_consultants} consultants x {years} year(s)...", flush=True)
+            with tempfile.TemporaryDirectory(prefix='consultfirm_bench_') as output_dir:
+                result_file = os.path.join(output_dir, 'result.json')
+                env = dict(os.environ, OUTPUT_DIR=output_dir)
+                command = [sys.executable, os.path.abspath(__file__), '--worker',
+                           '--consultants', str(initial_consultants), '--years', str(years),
+                           '--output', result_file]
+                completed = subprocess.run(command, env=env,
+                                           stdout=subprocess.DEVNULL if quiet else None,
+                                           stderr=subprocess.DEVNULL if quiet else None)
+                if completed.returncode != 0 or not os.path.exists(result_file):
+                    print(f"  failed (exit code {completed.returncode})")
+                    runs.append({'initial_consultants': initial_consultants, 'years': years, 'error': completed.returncode})
+                    continue
+                with open(result_file) as f:
+                    run = json.load(f)
+            print(f"  {run['total_seconds']:.1f}s total, peak RSS {run['peak_rss_mb']} MB")
+            runs.append(run)
+    return runs
+
+def environment_info():
+    import sqlalchemy, pandas, numpy
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'settings': {name: os.environ[name] for name in sorted(os.environ)
+                     if name.startswith(('DB_', 'REPORT_', 'SIMULATION_'))}
+    }
+
+def compare_to_baseline(results, baseline, tolerance):
+    '''
+    Print per-phase time ratios against the baseline and return the phases that are
+    slower by more than tolerance (0.2 = 20%).
+    '''
+    baseline_runs = {(run['initial_consultants'], run['years']): run for run in baseline['runs'] if 'phases' in run}
+    regressions = []
+    print(f"\n{'consultants':>11} {'years':>5} {'phase':<20} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for run in results['runs']:
+        reference = baseline_runs.get((run['initial_consultants'], run['years']))
+        if reference is None or 'phases' not in run:
+            continue
+        reference_phases = {phase['phase']: phase for phase in reference['phases']}
+        for phase in run['phases']:
+            reference_phase = reference_phases.get(phase['phase'])
+            if reference_phase is None or reference_phase['seconds'] <= 0:
+                continue
+            ratio = phase['seconds'] / reference_phase['seconds']
+            flag = ''
+            # Sub-second phases are too noisy to flag
+            if ratio > 1 + tolerance and phase['seconds'] - reference_phase['seconds'] > 0.5:
+                flag = '  REGRESSION'
+                regressions.append((run['initial_consultants'], run['years'], phase['phase'], ratio))
+            print(f"{run['initial_consultants']:>11} {run['years']:>5} {phase['phase']:<20} "
+                  f"{reference_phase['seconds']:>9.2f}s {phase['seconds']:>9.2f}s {ratio:>6.2f}x{flag}")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the generation pipeline over a grid of sizes.")
+    parser.add_argument('--consultants', type=int, nargs='+', default=[100, 250], help="INITIAL_CONSULTANTS values")
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 2], help="Simulated year spans")
+    parser.add_argument('--output', default=DEFAULT_RESULTS, help="Where to write the results JSON")
+    parser.add_argument('--baseline', help="Baseline results JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help=f"Also store the results as {DEFAULT_BASELINE}")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown before a phase is flagged")
+    parser.add_argument('--verbose', action='store_true', help="Show the pipeline's own output")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if args.worker:
+        result = run_cell(args.consultants[0], args.years[0])
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        return
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment_info(),
+        'runs': run_grid(args.consultants, args.years, quiet=not args.verbose)
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(DEFAULT_BASELINE), exist_ok=True)
+        with open(DEFAULT_BASELINE, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} phase(s) slower than the baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
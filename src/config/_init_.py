@@ -1,3 +1,6 @@
 from . import path_config
 from . import project_settings
-from . import consultant_settings
\ No newline at end of file
+from . import consultant_settings
+from . import db_settings
+from . import report_settings
+from . import generation_settings
\ No newline at end of file
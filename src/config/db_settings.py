@@ -0,0 +1,31 @@
+import os
+
+# SQLite engine profile used by the generators ('default', 'balanced' or 'bulk_load').
+# Generation runs are throwaway until they finish, so per-commit durability is optional.
+ENGINE_PROFILE = os.getenv('DB_ENGINE_PROFILE', 'default')
+
+# Build the whole database in memory and back it up to db_file_path at the end of generation
+IN_MEMORY_DATABASE = os.getenv('DB_IN_MEMORY', '0') == '1'
+
+# Hold the database file lock for the whole run (no other readers while generating)
+EXCLUSIVE_LOCKING = os.getenv('DB_EXCLUSIVE_LOCKING', '0') == '1'
+
+# Create secondary indexes after the consultant and payroll bulk load instead of with the schema
+DEFER_INDEX_CREATION = os.getenv('DB_DEFER_INDEXES', '0') == '1'
+
+# PRAGMAs applied to every new connection for each profile
+ENGINE_PROFILES = {
+    'default': {},
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,  # negative values are KiB (64 MB)
+        'temp_store': 'MEMORY'
+    },
+    'bulk_load': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -262144,  # 256 MB
+        'temp_store': 'MEMORY'
+    }
+}
@@ -0,0 +1,37 @@
+import os
+
+# Only extract and load rows added since the last ETL run (watermarks kept in etl_state_file)
+ETL_INCREMENTAL = os.getenv('ETL_INCREMENTAL', '0') == '1'
+
+# Watermark column per table for incremental runs. Tables not listed use their integer
+# primary key. Date watermarks assume rows are only appended for later dates, as an
+# incremental generation run does.
+WATERMARK_COLUMNS = {
+    'Consultant_Deliverable': 'Date',
+    'Payroll': 'EffectiveDate'
+}
+
+# Tables whose existing rows are updated by later simulated years (statuses, progress,
+# end dates). A watermark would miss those changes, so incremental runs reload them in full.
+FULL_REFRESH_TABLES = ['Project', 'Deliverable', 'ProjectTeam', 'Consultant_Title_History']
+
+# Staged dtypes follow the declared SQLite column types, except for columns that store
+# something else: timesheet hours are declared INTEGER but hold tenths of an hour
+STAGED_DTYPE_OVERRIDES = {
+    'Consultant_Deliverable': {'Hours': 'Float64'}
+}
+
+# Extraction: tables are read in parallel on read-only connections, in chunks of
+# ETL_CHUNK_SIZE rows, and staged as one file per chunk for the loader to stream
+ETL_WORKERS = int(os.getenv('ETL_WORKERS', str(min(4, os.cpu_count() or 1))))
+ETL_CHUNK_SIZE = int(os.getenv('ETL_CHUNK_SIZE', '100000'))
+# 'parquet' (compressed with ETL_STAGING_COMPRESSION), or 'csv' (gzip). Either way the
+# column dtypes come from the SQLite schema, not from each chunk's values
+ETL_STAGING_FORMAT = os.getenv('ETL_STAGING_FORMAT', 'parquet').lower()
+ETL_STAGING_COMPRESSION = os.getenv('ETL_STAGING_COMPRESSION', 'zstd')
+
+# Where the ETL loads: 'snowflake', or a local stand-in for offline load testing,
+# 'sqlite' or 'duckdb' (needs duckdb), written to ETL_TARGET_PATH
+ETL_TARGET = os.getenv('ETL_TARGET', 'snowflake').lower()
+# Tables loaded concurrently, each worker on its own target connection
+ETL_LOAD_WORKERS = int(os.getenv('ETL_LOAD_WORKERS', '4'))
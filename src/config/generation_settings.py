@@ -0,0 +1,39 @@
+import os
+
+# Root seed for every random stream in the generators. Unset draws fresh entropy;
+# the value actually used is printed at the start of a run so it can be replayed.
+RANDOM_SEED = int(os.environ['RANDOM_SEED']) if os.getenv('RANDOM_SEED') else None
+
+# Log level for the generators. Per-project and per-expense lines are INFO, so WARNING
+# skips building them altogether.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Instrumentation (see database_generator/utils/instrumentation.py)
+# Count calls and time for the simulation's hot functions
+COUNT_CALLS = os.getenv('COUNT_CALLS', '1') == '1'
+# Comma separated phase names to run under cProfile, or 'all'
+PROFILE_PHASES = [name.strip() for name in os.getenv('PROFILE_PHASES', '').split(',') if name.strip()]
+# Record peak traced Python memory per phase (tracemalloc slows the run down noticeably)
+TRACE_MEMORY = os.getenv('TRACE_MEMORY', '0') == '1'
+
+# Continue an interrupted project simulation from its last month-end checkpoint instead of
+# rebuilding the database. Needs the on-disk database of the interrupted run.
+RESUME = os.getenv('RESUME', '0') == '1'
+
+# Append this many years to the existing database instead of regenerating START_YEAR..END_YEAR
+# from scratch. Consultants, open title records, open projects and workloads carry over.
+EXTEND_YEARS = int(os.getenv('EXTEND_YEARS', '0'))
+
+# Entries per field in each locale's pre-generated name and contact pool
+# (see database_generator/utils/name_pools.py)
+NAME_POOL_SIZE = int(os.getenv('NAME_POOL_SIZE', '5000'))
+
+# Client feedback free-text answers: 'template' (CPU phrase banks) or 'llm' (Hugging Face
+# chat model, needs transformers/torch and HF_TOKEN for gated models)
+FEEDBACK_BACKEND = os.getenv('FEEDBACK_BACKEND', 'template').lower()
+FEEDBACK_LLM_MODEL = os.getenv('FEEDBACK_LLM_MODEL', 'meta-llama/Meta-Llama-3-8B-Instruct')
+# Device for the pipeline: a GPU index such as '0', or 'cpu'
+FEEDBACK_LLM_DEVICE = os.getenv('FEEDBACK_LLM_DEVICE', '0')
+FEEDBACK_LLM_BATCH_SIZE = int(os.getenv('FEEDBACK_LLM_BATCH_SIZE', '16'))
+# Cached answers generated per (tone, scores, question); projects pick among them
+FEEDBACK_LLM_VARIANTS = int(os.getenv('FEEDBACK_LLM_VARIANTS', '3'))
@@ -3,21 +3,44 @@ import os
 # Get the absolute path to the project root directory
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 
+# Root for all generated output; OUTPUT_DIR lets benchmark and scratch runs write elsewhere
+output_root = os.getenv('OUTPUT_DIR', os.path.join(project_root, 'example_output'))
+
 # Define paths
-db_path = os.path.join(project_root, 'example_output', 'database')
-ss_path = os.path.join(project_root, 'example_output', 'spreadsheets')
-json_path = os.path.join(project_root, 'example_output', 'json')
+db_path = os.path.join(output_root, 'database')
+ss_path = os.path.join(output_root, 'spreadsheets')
+json_path = os.path.join(output_root, 'json')
+benchmark_path = os.path.join(project_root, 'benchmark_results')
+instrumentation_path = os.path.join(output_root, 'instrumentation')
+# Reusable intermediate data (e.g. name pools), kept between runs
+cache_path = os.getenv('CACHE_DIR', os.path.join(project_root, '.cache'))
+etl_path = os.path.join(output_root, 'etl')
+etl_staging_path = os.path.join(etl_path, 'staging')
 
 # Create directories if they don't exist
 os.makedirs(db_path, exist_ok=True)
 os.makedirs(ss_path, exist_ok=True)
 os.makedirs(json_path, exist_ok=True)
 
+# Report output format: 'xlsx', 'csv', 'parquet' or 'arrow' (parquet and arrow need pyarrow)
+REPORT_FORMAT = os.getenv('REPORT_FORMAT', 'xlsx').lower()
+REPORT_EXTENSIONS = {'xlsx': 'xlsx', 'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrow'}
+if REPORT_FORMAT not in REPORT_EXTENSIONS:
+    raise ValueError(f"Unknown REPORT_FORMAT '{REPORT_FORMAT}'. Expected one of: {', '.join(REPORT_EXTENSIONS)}")
+
+def report_file_path(name, fmt=REPORT_FORMAT):
+    return os.path.join(ss_path, f"{name}.{REPORT_EXTENSIONS[fmt]}")
+
 # Define file paths
 db_file_path = os.path.join(db_path, 'consulting_firm.db')
-indirect_costs_path = os.path.join(ss_path, 'indirect_costs.xlsx')
-non_billable_time_path = os.path.join(ss_path, 'non_billable_time.xlsx')
+indirect_costs_path = report_file_path('indirect_costs')
+non_billable_time_path = report_file_path('non_billable_time')
 json_output_path = os.path.join(json_path, 'client_feedback.json')
+# Per-table high-watermarks of the last incremental ETL run
+etl_state_file = os.path.join(etl_path, 'etl_watermarks.json')
+# Local warehouse file for the 'sqlite' and 'duckdb' ETL targets, and the per-table load timings
+etl_target_path = os.getenv('ETL_TARGET_PATH', os.path.join(etl_path, 'warehouse.db'))
+etl_load_report_file = os.path.join(etl_path, 'load_report.json')
 
 # Print paths for debugging
 print(f"Project root: {project_root}")
@@ -1,5 +1,6 @@
 from decimal import Decimal
 import random
+import os
 
 '''
 Adjust a bigger team size and smaller concurrent active project per consultant
@@ -53,6 +54,16 @@ LOWER_LEVEL_TITLE_THRESHOLD = 2
 
 PROJECT_MONTH_DISTRIBUTION = [3, 4, 5, 6, 7, 8, 9, 10]
 
+# Project simulation engine: 'daily' steps through every calendar day,
+# 'event' only visits days with scheduled events and live projects
+SIMULATION_MODE = os.getenv('SIMULATION_MODE', 'daily').lower()
+SIMULATION_MODES = ('daily', 'event')
+if SIMULATION_MODE not in SIMULATION_MODES:
+    raise ValueError(f"Unknown SIMULATION_MODE '{SIMULATION_MODE}'. Expected one of: {', '.join(SIMULATION_MODES)}")
+
+# Timesheet (Consultant_Deliverable) rows buffered per executemany call
+TIMESHEET_BATCH_SIZE = 10000
+
 # Expense Categories and Percentages
 EXPENSE_CATEGORIES = {
     'Travel': 0.1,
@@ -107,4 +118,8 @@ EXPENSE_CATEGORIES = {
     'Telecommunication': {'percentage': 0.04, 'billable': True, 'range': (500, 15000)},
     'Legal and Professional Fees': {'percentage': 0.05, 'billable': False, 'range': (1000, 50000)},
     'Miscellaneous': {'percentage': 0.03, 'billable': False, 'range': (200, 10000)}
-}
\ No newline at end of file
+}
+# Worker processes for the project simulation. Above 1, business units are split into
+# that many groups, each simulated in its own SQLite shard and merged afterwards.
+# Teams are then staffed only from consultants in the shard's units.
+SIMULATION_WORKERS = int(os.getenv('SIMULATION_WORKERS', '1'))
@@ -0,0 +1,4 @@
+import os
+
+# Rows fetched per chunk when streaming report queries from the database
+REPORT_CHUNK_SIZE = int(os.getenv('REPORT_CHUNK_SIZE', '50000'))
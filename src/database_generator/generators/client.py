@@ -1,14 +1,16 @@
 from sqlalchemy.orm import sessionmaker
 from models.db_model import Client, Location, engine
-from faker import Faker
-import random
+from ..utils.random_streams import python_stream
+from ..utils.name_pools import get_pool
+
+rng = python_stream('clients')
 
 def generate_clients(num_clients):
     print("Gnerating Client Data...")
     Session = sessionmaker(bind=engine)
     session = Session()
 
-    fake = Faker('en_US')
+    company_pool = get_pool('en_US', 'company')
     client_data = []
 
     locations = session.query(Location).all()
@@ -30,12 +32,12 @@ def generate_clients(num_clients):
     for region, percentage in regions.items():
         count = int(num_clients * percentage)
         for _ in range(count):
-            location = random.choice(region_locations[region])
+            location = rng.choice(region_locations[region])
             client = Client(
-                ClientName=f"{fake.word().capitalize()} {fake.company_suffix()}",
+                ClientName=f"{company_pool.pick('word', rng).capitalize()} {company_pool.pick('company_suffix', rng)}",
                 LocationID=location.LocationID,
-                PhoneNumber=fake.phone_number(),
-                Email=fake.email()
+                PhoneNumber=company_pool.pick('phone_number', rng),
+                Email=company_pool.pick('email', rng)
             )
             client_data.append(client)
 
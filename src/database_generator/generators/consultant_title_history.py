@@ -1,45 +1,38 @@
-import random
-import unicodedata
-import re
-from faker import Faker
-from unidecode import unidecode
 from datetime import timedelta, date
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import flag_modified
 from collections import defaultdict
 from models.db_model import Consultant, BusinessUnit, ConsultantTitleHistory, ConsultantCustomData, engine
 from config import consultant_settings
+from ..utils.consultant_utils import ConsultantIdAllocator, TitleHistoryIndex
+from ..utils.random_streams import python_stream
+from ..utils.name_pools import get_pool
 
-fake = Faker()
-faker_instances = {locale: Faker(locale) for unit_id in consultant_settings.UNIT_LOCALE_MAPPING for locale in consultant_settings.UNIT_LOCALE_MAPPING[unit_id]}
+rng = python_stream('consultants')
 
 # Basic Helper functions
 def get_growth_rate(year):
     yearly_growth_rates = consultant_settings.CONSULTANT_YEARLY_GROWTHRATE
     default_rate = 0.25
-    variation = random.uniform(-0.05, 0.05)
+    variation = rng.uniform(-0.05, 0.05)
     return yearly_growth_rates.get(year, default_rate) + variation
 
-def get_faker_for_unit(unit_id):
+def get_name_pool_for_unit(unit_id):
     if unit_id in consultant_settings.UNIT_LOCALE_MAPPING:
-        locale = random.choice(consultant_settings.UNIT_LOCALE_MAPPING[unit_id])
-        return faker_instances[locale]
+        locale = rng.choice(consultant_settings.UNIT_LOCALE_MAPPING[unit_id])
+        return get_pool(locale)
     else:
-        return faker_instances["en_US"]
-
-def is_latin(text):
-    # Remove diacritical marks
-    text = ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn')
-    return bool(re.match(r'^[a-zA-Z\s]+$', text))
+        return get_pool("en_US")
 
 def get_hire_date(year):
-    season = random.choices(list(consultant_settings.HIRING_SEASON_PROB.keys()), weights=list(consultant_settings.HIRING_SEASON_PROB.values()))[0]
+    season = rng.choices(list(consultant_settings.HIRING_SEASON_PROB.keys()), weights=list(consultant_settings.HIRING_SEASON_PROB.values()))[0]
     if season == 'Spring':
-        month = random.randint(3, 5)
+        month = rng.randint(3, 5)
     elif season == 'Fall':
-        month = random.randint(9, 11)
+        month = rng.randint(9, 11)
     else:
-        month = random.choice([1, 2, 6, 7, 8, 12])
-    day = random.randint(1, 28)
+        month = rng.choice([1, 2, 6, 7, 8, 12])
+    day = rng.randint(1, 28)
     return date(year, month, day)
 
 def calculate_target_consultants(year, initial_num, start_year):
@@ -63,7 +56,7 @@ def generate_title_slots(num_consultants):
 def should_leave_company(consultant):
     custom_data = consultant.CustomData.CustomData if consultant.CustomData else {}
     title_id = custom_data.get('title_id', 1)
-    return random.random() < consultant_settings.ATTRITION_RATE[title_id]
+    return rng.random() < consultant_settings.ATTRITION_RATE[title_id]
 
 def should_be_promoted(consultant, years_in_role, total_years_in_company):
     custom_data = consultant.CustomData.CustomData if consultant.CustomData else {}
@@ -84,10 +77,10 @@ def should_be_promoted(consultant, years_in_role, total_years_in_company):
     tenure_bonus = min(0.2, total_years_in_company * 0.02)
     promotion_chance += tenure_bonus
     
-    return random.random() < promotion_chance
+    return rng.random() < promotion_chance
 
-def get_years_in_current_role(consultant_id, current_title_id, current_year, title_history_data):
-    relevant_history = [th for th in title_history_data if th.ConsultantID == consultant_id and th.TitleID == current_title_id]
+def get_years_in_current_role(consultant_id, current_title_id, current_year, title_history):
+    relevant_history = [th for th in title_history.for_consultant(consultant_id) if th.TitleID == current_title_id]
     relevant_history.sort(key=lambda x: x.StartDate, reverse=True)
     
     for entry in relevant_history:
@@ -100,10 +93,10 @@ def get_years_in_current_role(consultant_id, current_title_id, current_year, tit
 # Salary adjustment
 
 def get_new_salary(title_id):
-    return random.randint(consultant_settings.SALARY_RANGE[title_id][0], consultant_settings.SALARY_RANGE[title_id][1])
+    return rng.randint(consultant_settings.SALARY_RANGE[title_id][0], consultant_settings.SALARY_RANGE[title_id][1])
 
 def get_yearly_salary_adjustment():
-    return random.uniform(0.02, 0.05)
+    return rng.uniform(0.02, 0.05)
 
 # Handling Layoffs
 
@@ -113,7 +106,7 @@ def should_layoff(year, growth_rate):
 def get_layoff_percentage(growth_rate):
     return min(0.2, abs(growth_rate))
 
-def perform_layoffs(session, active_consultants, growth_rate, year, title_history_data):
+def perform_layoffs(session, active_consultants, growth_rate, year, title_history):
     layoff_percentage = get_layoff_percentage(growth_rate)
     total_consultants = sum(len(consultants) for consultants in active_consultants.values())
     num_layoffs = int(total_consultants * layoff_percentage)
@@ -130,11 +123,9 @@ def perform_layoffs(session, active_consultants, growth_rate, year, title_histor
         active_consultants[title] = consultants[title_layoffs:]
 
     for consultant, years_in_role, total_years in layoffs:
-        current_title_history = next(th for th in reversed(title_history_data) 
-                                     if th.ConsultantID == consultant.ConsultantID and th.EndDate is None)
-        layoff_date = date(year, random.randint(1, 12), random.randint(1, 28))
-        current_title_history.EndDate = layoff_date
-        title_history_data.append(ConsultantTitleHistory(
+        layoff_date = date(year, rng.randint(1, 12), rng.randint(1, 28))
+        current_title_history = title_history.close(consultant.ConsultantID, layoff_date)
+        title_history.append(ConsultantTitleHistory(
             ConsultantID=consultant.ConsultantID, 
             TitleID=current_title_history.TitleID,
             StartDate=date(year, 1, 1), 
@@ -142,26 +133,21 @@ def perform_layoffs(session, active_consultants, growth_rate, year, title_histor
             EventType='Layoff', 
             Salary=current_title_history.Salary
         ))
-    return num_layoffs, title_history_data
+    return num_layoffs, title_history
 
-def create_consultant(session, unit_id, title_id, hire_date):
-    faker = get_faker_for_unit(unit_id)
-    consultant_id = f"C{len(session.query(Consultant).all()) + 1:04d}"
-    
-    first_name = faker.first_name()
-    last_name = faker.last_name()
+def create_consultant(session, unit_id, title_id, hire_date, consultant_id):
+    name_pool = get_name_pool_for_unit(unit_id)
     
-    if not is_latin(first_name):
-        first_name = unidecode(first_name)
-    if not is_latin(last_name):
-        last_name = unidecode(last_name)
+    # Pool names are already transliterated
+    first_name = name_pool.pick('first_name', rng)
+    last_name = name_pool.pick('last_name', rng)
     
     first_name_initial = ''.join([name[0].lower() for name in first_name.split()])       
     last_name_email = last_name.replace(" ", "").lower()
     email_suffix = consultant_id[-4:]
     email = f"{first_name_initial}{last_name_email}{email_suffix}@ise558.com"
 
-    phone = faker.phone_number()
+    phone = name_pool.pick('phone_number', rng)
     consultant = Consultant(ConsultantID=consultant_id, FirstName=first_name, LastName=last_name, 
                             Email=email, Contact=phone, BusinessUnitID=unit_id, HireYear=hire_date.year)
     
@@ -174,6 +160,8 @@ def create_consultant(session, unit_id, title_id, hire_date):
         }
     )
     
+    # Link in memory so CustomData is readable before the consultant is flushed
+    consultant.CustomData = consultant_custom_data
     session.add(consultant)
     session.add(consultant_custom_data)
     
@@ -185,20 +173,57 @@ def create_consultant(session, unit_id, title_id, hire_date):
     
     return consultant, title_history
 
+def load_consultant_data(session):
+    '''
+    Consultants still employed (with an open title record) and their full title
+    history, as the starting point for appending years to an existing database.
+    '''
+    consultant_data = session.query(Consultant).join(
+        ConsultantTitleHistory, Consultant.ConsultantID == ConsultantTitleHistory.ConsultantID
+    ).filter(ConsultantTitleHistory.EndDate.is_(None)).order_by(Consultant.ConsultantID).all()
+
+    title_history = TitleHistoryIndex()
+    active_ids = {consultant.ConsultantID for consultant in consultant_data}
+    for record in session.query(ConsultantTitleHistory).order_by(
+        ConsultantTitleHistory.ConsultantID, ConsultantTitleHistory.StartDate, ConsultantTitleHistory.ID
+    ):
+        if record.ConsultantID in active_ids:
+            title_history.append(record)
+
+    # The project simulation only refreshes title_id at the start of each year, so take
+    # the current title from the open record
+    for consultant in consultant_data:
+        title_id = title_history.open_record(consultant.ConsultantID).TitleID
+        if consultant.CustomData and consultant.CustomData.CustomData.get('title_id') != title_id:
+            consultant.CustomData.CustomData['title_id'] = title_id
+            flag_modified(consultant.CustomData, 'CustomData')
+    return consultant_data, title_history
+
+def existing_units(consultant_data):
+    '''Units already opened, in the order their expansion thresholds are reached.'''
+    units = {consultant.BusinessUnitID for consultant in consultant_data}
+    return [1] + [unit for _, unit in sorted(consultant_settings.EXPANSION_THRESHOLDS.items()) if unit in units and unit != 1]
+
 # Main generation logicic
-def generate_consultant_data(session, initial_num_consultants, start_year, end_year):
-    consultant_data = []
-    title_history_data = []
-
-    # Initialize consultants for the start year
-    start_date = date(start_year, 1, 1)
-    title_slots = generate_title_slots(initial_num_consultants)
-    for title_id in sorted(title_slots.keys(), reverse=True):
-        num_slots = title_slots[title_id]
-        for _ in range(num_slots):
-            consultant, title_history = create_consultant(session, 1, title_id, start_date)  # Start with North America (unit_id 1)
-            consultant_data.append(consultant)
-            title_history_data.append(title_history)
+def generate_consultant_data(session, initial_num_consultants, start_year, end_year, existing=None):
+    id_allocator = ConsultantIdAllocator.from_session(session)
+
+    if existing:
+        # Continue from the consultants already in the database
+        consultant_data, title_history = existing
+    else:
+        consultant_data = []
+        title_history = TitleHistoryIndex()
+
+        # Initialize consultants for the start year
+        start_date = date(start_year, 1, 1)
+        title_slots = generate_title_slots(initial_num_consultants)
+        for title_id in sorted(title_slots.keys(), reverse=True):
+            num_slots = title_slots[title_id]
+            for consultant_id in id_allocator.reserve(num_slots):
+                consultant, title_record = create_consultant(session, 1, title_id, start_date, consultant_id)  # Start with North America (unit_id 1)
+                consultant_data.append(consultant)
+                title_history.append(title_record)
 
     for year in range(start_year, end_year + 1):
         growth_rate = get_growth_rate(year)
@@ -209,20 +234,19 @@ def generate_consultant_data(session, initial_num_consultants, start_year, end_y
         
         # Process existing consultants
         for consultant in list(consultant_data):
-            current_title_history = next((th for th in reversed(title_history_data) 
-                                        if th.ConsultantID == consultant.ConsultantID and th.EndDate is None), None)
+            current_title_history = title_history.open_record(consultant.ConsultantID)
             if not current_title_history:
                 continue
 
             custom_data = consultant.CustomData.CustomData if consultant.CustomData else {}
             current_title_id = custom_data.get('title_id', 1)
-            years_in_role = get_years_in_current_role(consultant.ConsultantID, current_title_id, year, title_history_data)
+            years_in_role = get_years_in_current_role(consultant.ConsultantID, current_title_id, year, title_history)
             total_years = year - consultant.HireYear
 
             if should_leave_company(consultant):
-                leave_date = date(year, random.randint(1, 12), random.randint(1, 28))
-                current_title_history.EndDate = leave_date
-                title_history_data.append(ConsultantTitleHistory(
+                leave_date = date(year, rng.randint(1, 12), rng.randint(1, 28))
+                title_history.close(consultant.ConsultantID, leave_date)
+                title_history.append(ConsultantTitleHistory(
                     ConsultantID=consultant.ConsultantID, TitleID=current_title_id, 
                     StartDate=date(year, 1, 1), EndDate=leave_date, 
                     EventType='Attrition', Salary=current_title_history.Salary
@@ -233,7 +257,7 @@ def generate_consultant_data(session, initial_num_consultants, start_year, end_y
 
         # Handle layoffs
         if should_layoff(year, growth_rate):
-            num_layoffs, title_history_data = perform_layoffs(session, active_consultants, growth_rate, year, title_history_data)
+            num_layoffs, title_history = perform_layoffs(session, active_consultants, growth_rate, year, title_history)
 
         # Process promotions
         promotions = 0
@@ -246,13 +270,11 @@ def generate_consultant_data(session, initial_num_consultants, start_year, end_y
             available_slots = max(0, title_slots[title_id + 1] - len(active_consultants[title_id + 1]))
                 
             for candidate, years_in_role, total_years in promotion_candidates[:available_slots]:
-                promotion_date = date(year, random.randint(1, 12), random.randint(1, 28))
-                current_title_history = next(th for th in reversed(title_history_data) 
-                                            if th.ConsultantID == candidate.ConsultantID and th.EndDate is None)
-                current_title_history.EndDate = promotion_date - timedelta(days=1)
+                promotion_date = date(year, rng.randint(1, 12), rng.randint(1, 28))
+                current_title_history = title_history.close(candidate.ConsultantID, promotion_date - timedelta(days=1))
                 
                 new_salary = max(get_new_salary(title_id + 1), int(current_title_history.Salary * 1.1))
-                title_history_data.append(ConsultantTitleHistory(
+                title_history.append(ConsultantTitleHistory(
                     ConsultantID=candidate.ConsultantID, TitleID=title_id + 1, 
                     StartDate=promotion_date, EventType='Promotion', Salary=new_salary
                 ))
@@ -264,37 +286,38 @@ def generate_consultant_data(session, initial_num_consultants, start_year, end_y
                 consultant_custom_data = session.query(ConsultantCustomData).get(candidate.ConsultantID)
                 if consultant_custom_data:
                     consultant_custom_data.CustomData['title_id'] = title_id + 1
+                    flag_modified(consultant_custom_data, 'CustomData')
 
         # Handle new hires
         new_hires = 0
         for title_id in range(1, 7):
-            while len(active_consultants[title_id]) < title_slots[title_id]:
-                region = random.choices(list(consultant_settings.BUSINESS_UNIT_DISTRIBUTION.keys()), 
+            open_positions = title_slots[title_id] - len(active_consultants[title_id])
+            for consultant_id in id_allocator.reserve(open_positions):
+                region = rng.choices(list(consultant_settings.BUSINESS_UNIT_DISTRIBUTION.keys()), 
                                         weights=list(consultant_settings.BUSINESS_UNIT_DISTRIBUTION.values()))[0]
                 hire_date = get_hire_date(year)
-                new_consultant, new_title_history = create_consultant(session, region, title_id, hire_date)
+                new_consultant, new_title_history = create_consultant(session, region, title_id, hire_date, consultant_id)
                 consultant_data.append(new_consultant)
-                title_history_data.append(new_title_history)
+                title_history.append(new_title_history)
                 active_consultants[title_id].append((new_consultant, 0, 0))
                 new_hires += 1
 
         # Create continuation records
         for title_id, consultants in active_consultants.items():
             for consultant, years_in_role, total_years in consultants:
-                current_title_history = next(th for th in reversed(title_history_data) 
-                                            if th.ConsultantID == consultant.ConsultantID and th.EndDate is None)
+                current_title_history = title_history.open_record(consultant.ConsultantID)
                 if current_title_history.StartDate.year < year:
                     salary_adjustment = get_yearly_salary_adjustment()
                     new_salary = int(current_title_history.Salary * (1 + salary_adjustment))
-                    current_title_history.EndDate = date(year, 1, 1) - timedelta(days=1)
-                    title_history_data.append(ConsultantTitleHistory(
+                    title_history.close(consultant.ConsultantID, date(year, 1, 1) - timedelta(days=1))
+                    title_history.append(ConsultantTitleHistory(
                         ConsultantID=consultant.ConsultantID, TitleID=title_id, 
                         StartDate=date(year, 1, 1), EventType='Continuation', Salary=new_salary
                     ))
 
         print(f"Year {year}: Total consultants: {len(consultant_data)}, Promotions: {promotions}, New Hires: {new_hires}")
 
-    return consultant_data, title_history_data
+    return consultant_data, title_history.all_records
 
 def assign_business_units(consultant_data, session):
     business_units = session.query(BusinessUnit).all()
@@ -318,9 +341,9 @@ def assign_business_units(consultant_data, session):
 
     return consultant_data
 
-def simulate_global_expansion(consultant_data, start_year, end_year):
+def simulate_global_expansion(consultant_data, start_year, end_year, active_units=None):
     unit_ids = list(consultant_settings.BUSINESS_UNIT_DISTRIBUTION.keys())
-    active_units = [1]  # Start with North America
+    active_units = list(active_units or [1])  # Start with North America
     
     for year in range(start_year, end_year + 1):
         total_consultants = len([c for c in consultant_data if c.HireYear <= year])
@@ -333,23 +356,33 @@ def simulate_global_expansion(consultant_data, start_year, end_year):
         
         new_consultants = [c for c in consultant_data if c.HireYear == year]
         for consultant in new_consultants:
-            consultant.BusinessUnitID = random.choices(
+            consultant.BusinessUnitID = rng.choices(
                 active_units,
                 weights=[consultant_settings.BUSINESS_UNIT_DISTRIBUTION[u] for u in active_units]
             )[0]
 
     return active_units
 
-def main(initial_num_consultants, start_year, end_year):
+def main(initial_num_consultants, start_year, end_year, extend=False):
+    '''
+    With extend, start_year..end_year are appended to the consultants already in the
+    database and the headcount they start from replaces initial_num_consultants.
+    '''
     print("Generating consultant data...")
     Session = sessionmaker(bind=engine)
     session = Session()
 
     try:
-        consultant_data, title_history_data = generate_consultant_data(session, initial_num_consultants, start_year, end_year)
+        existing = load_consultant_data(session) if extend else None
+        active_units = None
+        if existing:
+            initial_num_consultants = len(existing[0])
+            active_units = existing_units(existing[0])
+            print(f"Extending {initial_num_consultants} active consultants from {start_year}")
+        consultant_data, title_history_data = generate_consultant_data(session, initial_num_consultants, start_year, end_year, existing)
         
         print("\nSimulating global expansion...")
-        final_units = simulate_global_expansion(consultant_data, start_year, end_year)
+        final_units = simulate_global_expansion(consultant_data, start_year, end_year, active_units)
         print(f"Final active unit IDs at {end_year}: {', '.join(map(str, final_units))}")
 
         print("\nAssigning business units...")
@@ -1,50 +1,87 @@
-import random
+import numpy as np
 from datetime import date
-from dateutil.relativedelta import relativedelta
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import func
-from models.db_model import Consultant, ConsultantTitleHistory, Payroll, engine
+from models.db_model import ConsultantTitleHistory, Payroll, engine
+from ..utils.bulk_insert import BulkInsertBuffer
+from ..utils.random_streams import numpy_stream
 
-def generate_payroll(end_year):
-    print("Generating Payroll Data...")
-    Session = sessionmaker(bind=engine)
-    session = Session()
+PAYROLL_VARIATION = 0.05  # Monthly pay varies by up to +/- 5% of the base
 
-    consultants = session.query(Consultant).all()
-    all_payroll_records = []
+def expand_monthly_pay_dates(start_dates, end_dates):
+    '''
+    Expand each [start, end] range into monthly pay dates, stepping one month at a time
+    from the start date like date + relativedelta(months=1): a day that does not exist
+    in a shorter month is clamped to its last day and stays there for the rest of the
+    range. Returns the pay dates and, for each one, the index of the range it came from.
+    '''
+    start_days = (start_dates - start_dates.astype('datetime64[M]')).astype(int)
+    start_months = start_dates.astype('datetime64[M]')
+    end_months = end_dates.astype('datetime64[M]')
 
-    for consultant in consultants:
-        title_history = session.query(ConsultantTitleHistory).filter_by(ConsultantID=consultant.ConsultantID).order_by(ConsultantTitleHistory.StartDate).all()
+    # Every month the range touches; the last one is dropped below if it pays too late
+    counts = np.maximum((end_months - start_months).astype(int) + 1, 0)
+    range_index = np.repeat(np.arange(len(start_dates)), counts)
+    month_offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    pay_months = start_months[range_index] + month_offsets
 
-        for i in range(len(title_history)):
-            start_date = title_history[i].StartDate
-            end_date = min(title_history[i].EndDate or date(end_year, 12, 31), date(end_year, 12, 31))
+    # Running minimum of the day within each range. Earlier ranges are shifted above
+    # every later one so the accumulation restarts at each range.
+    month_lengths = ((pay_months + 1).astype('datetime64[D]') - pay_months.astype('datetime64[D]')).astype(int)
+    shift = (len(start_dates) - range_index) * 32
+    days = np.minimum.accumulate(np.minimum(start_days[range_index], month_lengths - 1) + shift) - shift
 
-            base_salary = title_history[i].Salary
-            monthly_base = base_salary / 12  # Monthly base salary
+    pay_dates = pay_months.astype('datetime64[D]') + days
+    keep = pay_dates <= end_dates[range_index]
+    return pay_dates[keep], range_index[keep]
 
-            current_date = start_date
-            while current_date <= end_date:
-                payroll_amount = monthly_base
+def generate_payroll(end_year, rng=None, start_year=None):
+    '''
+    Monthly payroll for every title record up to end_year. With start_year, only pay
+    dates from that year on are written, for appending years to an existing database.
+    '''
+    print("Generating Payroll Data...")
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    rng = rng or numpy_stream('payroll')
 
-                variation_percentage = random.uniform(-0.05, 0.05)
-                payroll_amount += payroll_amount * variation_percentage
-                payroll_amount = round(payroll_amount, 2)
+    query = session.query(
+        ConsultantTitleHistory.ConsultantID,
+        ConsultantTitleHistory.StartDate,
+        ConsultantTitleHistory.EndDate,
+        ConsultantTitleHistory.Salary
+    )
+    if start_year:
+        query = query.filter(ConsultantTitleHistory.EndDate.is_(None) | (ConsultantTitleHistory.EndDate >= date(start_year, 1, 1)))
+    title_history = query.order_by(ConsultantTitleHistory.ConsultantID, ConsultantTitleHistory.StartDate).all()
 
-                payroll = Payroll(ConsultantID=consultant.ConsultantID, Amount=payroll_amount, EffectiveDate=current_date)
-                all_payroll_records.append(payroll)
+    if not title_history:
+        session.close()
+        print("Complete")
+        return
 
-                current_date += relativedelta(months=1)
-                if current_date > end_date:
-                    break
+    last_day = date(end_year, 12, 31)
+    consultant_ids = np.array([row.ConsultantID for row in title_history], dtype=object)
+    start_dates = np.array([row.StartDate for row in title_history], dtype='datetime64[D]')
+    end_dates = np.array([min(row.EndDate or last_day, last_day) for row in title_history], dtype='datetime64[D]')
+    monthly_base = np.array([row.Salary for row in title_history], dtype=float) / 12
 
-    # Sort all payroll records by date
-    all_payroll_records.sort(key=lambda x: x.EffectiveDate)
+    pay_dates, range_index = expand_monthly_pay_dates(start_dates, end_dates)
+    if start_year:
+        # Earlier months were paid when those years were generated
+        keep = pay_dates >= np.datetime64(date(start_year, 1, 1))
+        pay_dates, range_index = pay_dates[keep], range_index[keep]
+    variation = rng.uniform(-PAYROLL_VARIATION, PAYROLL_VARIATION, len(pay_dates))
+    amounts = np.round(monthly_base[range_index] * (1 + variation), 2)
 
-    # Add sorted records to the session
-    for record in all_payroll_records:
-        session.add(record)
+    # Insert in date order, matching the previous record ordering
+    order = np.argsort(pay_dates, kind='stable')
+    payroll_writer = BulkInsertBuffer(Payroll, ['ConsultantID', 'Amount', 'EffectiveDate']).bind(session)
+    payroll_writer.extend(zip(
+        consultant_ids[range_index][order].tolist(),
+        amounts[order].tolist(),
+        np.datetime_as_string(pay_dates[order], unit='D').tolist()
+    ))
 
     session.commit()
     session.close()
-    print("Complete")
+    print(f"Complete ({payroll_writer.rows_written} payroll records)")
@@ -1,4 +1,3 @@
-import random
 import logging
 import traceback
 from scipy.stats import norm
@@ -7,84 +6,305 @@ from dateutil.relativedelta import relativedelta
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import func
 from collections import defaultdict
-from decimal import Decimal
 from models.db_model import *
 from ..utils.project_utils import *
 from ..utils.project_financial_utils import *
-from config import project_settings, consultant_settings
+from ..utils.consultant_utils import ConsultantStateRegistry, AvailabilityTracker
+from ..utils.event_scheduler import *
+from ..utils.bulk_insert import BulkInsertBuffer
+from ..utils.random_streams import python_stream, numpy_stream
+from ..utils.instrumentation import counted, log_enabled
+from ..utils.project_working_set import ProjectWorkingSet
+from ..utils.checkpoint import save_checkpoint, load_checkpoint, clear_checkpoint, ResumePoint
+from config import project_settings, consultant_settings, generation_settings
                 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=generation_settings.LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def generate_projects(start_year, end_year, initial_consultants):
+rng = python_stream('projects')
+
+# Daily hour limits per title, in tenths of an hour
+MAX_DAILY_TENTHS = {title: to_tenths(hours) for title, hours in project_settings.MAX_DAILY_HOURS_PER_TITLE.items()}
+MIN_DAILY_TENTHS = {title: to_tenths(hours) for title, hours in project_settings.MIN_DAILY_HOURS_PER_PROJECT.items()}
+DEFAULT_MAX_DAILY_TENTHS = to_tenths(8.0)
+DEFAULT_MIN_DAILY_TENTHS = to_tenths(2.0)
+
+# Titles that can manage a project
+PROJECT_MANAGER_TITLES = range(4, 7)
+
+# Months stepped through each simulated year (December is not simulated)
+SIMULATED_MONTHS = list(range(1, 12))
+
+def end_step(session):
+    '''
+    Flush and expire like a commit would, but keep the transaction open: a simulated
+    month is committed once, together with its checkpoint.
+    '''
+    session.flush()
+    session.expire_all()
+
+def begin_savepoint(session):
+    '''
+    SAVEPOINT for undoing a single project's changes. pysqlite only opens a transaction
+    before DML, and a SAVEPOINT outside one would commit the month early on release.
+    '''
+    dbapi_connection = session.connection().connection.dbapi_connection
+    if not dbapi_connection.in_transaction:
+        dbapi_connection.execute('BEGIN')
+    return session.begin_nested()
+
+def generate_projects(start_year, end_year, initial_consultants, mode=project_settings.SIMULATION_MODE, bind=None, resume=False):
+    '''Simulate projects from start_year to end_year. Returns False if the run stopped on an error.'''
     yearly_targets = calculate_yearly_project_targets(start_year, end_year, initial_consultants)
     
-    Session = sessionmaker(bind=engine)
+    Session = sessionmaker(bind=bind or engine)
     session = Session()
-    simulation_start_date = date(start_year, 1, 1)
-    simulation_end_date = date(end_year, 12, 31)
     print("Generating Project Data...")
 
+    # Continue after the last committed month instead of starting over
+    checkpoint = load_checkpoint(session) if resume else None
+    resume_point = ResumePoint(session, checkpoint, mode, start_year) if checkpoint else None
+    if resume_point:
+        print(f"Resuming after {resume_point.year}-{resume_point.month:02d}")
+
+    # Consultant metadata lives in memory for the run and is written back on commit
+    consultant_state = ConsultantStateRegistry.load(session).bind(session)
+    # Who can be staffed, per title and least busy first, follows the registry and the title history
+    availability = AvailabilityTracker.load(session, consultant_state, resume_point.resume_date if resume_point else date(start_year, 1, 1))
+    # So does deliverable progress of the projects in flight
+    working_set = ProjectWorkingSet().bind(session)
+    # Predefined expenses are looked up by month instead of scanning each project's list
+    expense_calendar = ExpenseCalendar().bind(session)
+    # Timesheet rows bypass the ORM and are written in batches
+    timesheet_writer = BulkInsertBuffer(
+        ConsultantDeliverable, ['ConsultantID', 'DeliverableID', 'Date', 'Hours'],
+        chunk_size=project_settings.TIMESHEET_BATCH_SIZE
+    ).bind(session)
+
     try:
-        for current_year in range(start_year, end_year + 1):
+        if mode == 'event':
+            run_event_simulation(session, start_year, end_year, yearly_targets, consultant_state, availability, working_set, expense_calendar, timesheet_writer, resume_point)
+        else:
+            run_daily_simulation(session, start_year, end_year, yearly_targets, consultant_state, availability, working_set, expense_calendar, timesheet_writer, resume_point)
+
+        clear_checkpoint(session)
+        session.commit()
+        return True
+
+    except Exception as e:
+        print(f"An error occurred while processing projects: {str(e)}")
+        print(traceback.format_exc())
+        session.rollback()
+        print("Months committed before the error are kept; rerun with RESUME=1 to continue from the last checkpoint.")
+        return False
+    finally:
+        session.close()
+
+def run_daily_simulation(session, start_year, end_year, yearly_targets, consultant_state, availability, working_set, expense_calendar, timesheet_writer, resume_point=None):
+    simulation_start_date = date(start_year, 1, 1)
+    simulation_end_date = date(end_year, 12, 31)
+
+    for current_year in range(start_year, end_year + 1):
+        if resume_point and current_year < resume_point.year:
+            continue
+        if resume_point and current_year == resume_point.year:
+            monthly_targets = resume_point.monthly_targets
+        else:
             monthly_targets = distribute_monthly_targets(yearly_targets[current_year])
-            
-            # Update available consultants at the start of each year
-            available_consultants = get_available_consultants(session, date(current_year, 1, 1))
-            
-            for current_month in range(1, 12):
-                month_start = date(current_year, current_month, 1)
-                if month_start > simulation_end_date:
-                    break
+            availability.advance(date(current_year, 1, 1))
+        
+        for current_month in SIMULATED_MONTHS:
+            if resume_point and resume_point.is_done(current_year, current_month):
+                continue
+            month_start = date(current_year, current_month, 1)
+            if month_start > simulation_end_date:
+                break
 
-                logging.info(f"Processing {month_start.strftime('%B %Y')}...")
+            logging.info(f"Processing {month_start.strftime('%B %Y')}...")
 
-                active_units = session.query(BusinessUnit).all()
+            active_units = session.query(BusinessUnit).all()
 
-                available_consultants = create_new_projects_if_needed(session, month_start, available_consultants, active_units, simulation_start_date, monthly_targets)
-                
-                # Daily simulation within the month
-                current_date = month_start
-                while current_date.month == current_month:
-                    start_due_projects(session, current_date)
-                    if current_date.weekday() < 5:  # Weekday
-                        generate_daily_consultant_deliverables(session, current_date, session.query(Project).all())
-                    update_project_statuses(session, current_date, available_consultants)
-                    current_date += timedelta(days=1)
+            create_new_projects_if_needed(session, month_start, availability, active_units, simulation_start_date, monthly_targets, consultant_state)
+            
+            # Daily simulation within the month
+            current_date = month_start
+            while current_date.month == current_month:
+                start_due_projects(session, current_date, consultant_state)
+                if current_date.weekday() < 5:  # Weekday
+                    generate_daily_consultant_deliverables(session, current_date, session.query(Project).all(), consultant_state, working_set, timesheet_writer)
+                update_project_statuses(session, current_date, consultant_state, working_set)
+                current_date += timedelta(days=1)
+
+            # End of month operations
+            month_end = current_date - timedelta(days=1)
+            update_existing_projects(session, month_end, availability, consultant_state, working_set)
+
+            # Generate monthly expenses for all active projects
+            active_projects = session.query(Project).filter(Project.Status.in_(['Not Started', 'In Progress'])).all()
+            generate_expense_records(session, active_projects, month_end, expense_calendar)
+
+            save_checkpoint(session, 'daily', start_year, current_year, current_month, monthly_targets)
+            session.commit()
 
-                # End of month operations
-                month_end = current_date - timedelta(days=1)
-                update_existing_projects(session, month_end, available_consultants)
+        print(f"Project generation for year {current_year} completed successfully.")
 
-                # Generate monthly expenses for all active projects
-                active_projects = session.query(Project).filter(Project.Status.in_(['Not Started', 'In Progress'])).all()
-                for project in active_projects:
-                    generate_expense_records(session, project, month_end)
+def run_event_simulation(session, start_year, end_year, yearly_targets, consultant_state, availability, working_set, expense_calendar, timesheet_writer, resume_point=None):
+    '''
+    Same calendar as run_daily_simulation, but driven by a priority queue of events.
+    Days without events are skipped and only live (started, unfinished) projects are touched.
+    '''
+    simulation_start_date = date(start_year, 1, 1)
+    scheduler = EventScheduler()
+    month_windows = {}
+
+    for current_year in range(start_year, end_year + 1):
+        if not resume_point or current_year > resume_point.year:
+            scheduler.schedule(date(current_year, 1, 1), YEAR_START, current_year)
+        for current_month in SIMULATED_MONTHS:
+            if resume_point and resume_point.is_done(current_year, current_month):
+                continue
+            month_start = date(current_year, current_month, 1)
+            month_end = month_start + relativedelta(months=1) - timedelta(days=1)
+            month_windows[(current_year, current_month)] = (month_start, month_end)
+            scheduler.schedule(month_start, MONTH_START)
+            scheduler.schedule(month_end, MONTH_END)
+    if not month_windows:
+        return
+    window_starts = sorted(start for start, _ in month_windows.values())
+    last_simulated_date = max(end for _, end in month_windows.values())
+
+    # Project IDs only: the ORM objects are expired after every step, so projects are
+    # loaded again in one query when an event needs them
+    pending_projects = set()  # Not Started, waiting for their start event
+    live_projects = set()     # In Progress
+    last_project_id = 0
+    next_workday = None
+    last_workday = None
+    monthly_targets = []
+
+    def load_projects(project_ids):
+        if not project_ids:
+            return []
+        return session.query(Project).filter(Project.ProjectID.in_(project_ids)).order_by(Project.ProjectID).all()
+
+    def track_project(project, current_date):
+        if project.Status == 'In Progress':
+            live_projects.add(project.ProjectID)
+        elif project.Status == 'Not Started':
+            pending_projects.add(project.ProjectID)
+            scheduler.schedule(max(project.ActualStartDate, current_date), PROJECT_START, project.ProjectID)
+        else:
+            return
+        for deliverable in project.Deliverables:
+            if deliverable.DueDate >= current_date:
+                scheduler.schedule(deliverable.DueDate, DELIVERABLE_DUE, project.ProjectID)
+        scheduler.schedule(max(project.ActualStartDate + timedelta(days=121), current_date), PROJECT_TIMEOUT, project.ProjectID)
+
+    def schedule_workday(current_date):
+        nonlocal next_workday
+        window = month_windows.get((current_date.year, current_date.month))
+        if window is None:
+            return
+        _, window_end = window
+        while current_date.weekday() >= 5:
+            current_date += timedelta(days=1)
+        if current_date <= window_end and (next_workday is None or next_workday < current_date):
+            next_workday = current_date
+            scheduler.schedule(current_date, WORKDAY)
+
+    def refresh_statuses(current_date, projects):
+        live_projects.difference_update(
+            update_project_statuses(session, current_date, consultant_state, working_set, projects=projects))
+
+    if resume_point:
+        monthly_targets = resume_point.monthly_targets
+
+    # Projects left open by a previous run (or before the checkpoint) carry over into this one
+    tracking_start = resume_point.resume_date if resume_point else simulation_start_date
+    for project in session.query(Project).filter(Project.Status.in_(['Not Started', 'In Progress'])).order_by(Project.ProjectID).all():
+        track_project(project, tracking_start)
+    last_project_id = session.query(func.max(Project.ProjectID)).scalar() or 0
+
+    while scheduler:
+        current_date, kind, payload = scheduler.pop()
+        if current_date > last_simulated_date:
+            break
 
-                session.commit()
+        # Months the calendar does not simulate defer their events to the next simulated month
+        if (current_date.year, current_date.month) not in month_windows:
+            later_starts = [start for start in window_starts if start > current_date]
+            if later_starts:
+                scheduler.schedule(later_starts[0], kind, payload)
+            continue
 
-            print(f"Project generation for year {current_year} completed successfully.")
+        if kind == YEAR_START:
+            monthly_targets = distribute_monthly_targets(yearly_targets[payload])
+            availability.advance(current_date)
 
-    except Exception as e:
-        print(f"An error occurred while processing projects: {str(e)}")
-        print(traceback.format_exc())
-        session.rollback()
-    finally:
-        session.close()
+        elif kind == MONTH_START:
+            logging.info(f"Processing {current_date.strftime('%B %Y')}...")
+            active_units = session.query(BusinessUnit).all()
+            create_new_projects_if_needed(session, current_date, availability, active_units, simulation_start_date, monthly_targets, consultant_state)
+
+            for project in session.query(Project).filter(Project.ProjectID > last_project_id).order_by(Project.ProjectID).all():
+                track_project(project, current_date)
+                last_project_id = project.ProjectID
+            if live_projects:
+                schedule_workday(current_date)
+
+        elif kind == PROJECT_START:
+            if payload not in pending_projects:
+                continue
+            pending_projects.discard(payload)
+            project = session.get(Project, payload)
+            if project.Status == 'Not Started':
+                start_project(session, project, current_date, consultant_state)
+                end_step(session)
+            elif project.Status != 'In Progress':
+                continue
+            live_projects.add(payload)
+            schedule_workday(current_date)
+
+        elif kind == WORKDAY:
+            next_workday = None
+            last_workday = current_date
+            # ProjectID order, so a resumed run visits projects in the same order
+            projects = load_projects(live_projects)
+            generate_daily_consultant_deliverables(session, current_date, projects, consultant_state, working_set, timesheet_writer)
+            refresh_statuses(current_date, projects)
+            if live_projects:
+                schedule_workday(current_date + timedelta(days=1))
+
+        elif kind in (DELIVERABLE_DUE, PROJECT_TIMEOUT):
+            # A workday has already refreshed every live project on its date
+            if payload in live_projects and current_date != last_workday:
+                refresh_statuses(current_date, [session.get(Project, payload)])
+
+        elif kind == MONTH_END:
+            update_existing_projects(session, current_date, availability, consultant_state, working_set)
+
+            loaded = {project.ProjectID: project for project in load_projects(pending_projects | live_projects)}
+            # Month-end updates may have started projects ahead of their start event
+            for project_id in sorted(pending_projects):
+                if loaded[project_id].Status == 'In Progress':
+                    pending_projects.discard(project_id)
+                    live_projects.add(project_id)
+
+            open_projects = [loaded[project_id] for project_id in sorted(pending_projects)] + \
+                            [loaded[project_id] for project_id in sorted(live_projects)]
+            generate_expense_records(session, [p for p in open_projects if p.Status in ['Not Started', 'In Progress']],
+                                     current_date, expense_calendar)
+
+            save_checkpoint(session, 'event', start_year, current_date.year, current_date.month, monthly_targets)
+            session.commit()
 
-def update_consultant_custom_data(session, consultant_id, project_id, action, current_date):
-    consultant_custom_data = session.query(ConsultantCustomData).get(consultant_id)
-    if not consultant_custom_data:
-        consultant_custom_data = ConsultantCustomData(ConsultantID=consultant_id, CustomData={})
-        session.add(consultant_custom_data)
+            if current_date.month == SIMULATED_MONTHS[-1] or current_date == last_simulated_date:
+                print(f"Project generation for year {current_date.year} completed successfully.")
 
+def update_consultant_custom_data(consultant_state, consultant_id, project_id, action, current_date):
     if action == 'add':
-        consultant_custom_data.CustomData['active_project_count'] = consultant_custom_data.CustomData.get('active_project_count', 0) + 1
-        consultant_custom_data.CustomData['last_project_date'] = current_date.isoformat()
+        consultant_state.add_project(consultant_id, current_date)
     elif action == 'remove':
-        consultant_custom_data.CustomData['active_project_count'] = max(0, consultant_custom_data.CustomData.get('active_project_count', 1) - 1)
-        consultant_custom_data.CustomData['last_project_date'] = current_date.isoformat()
-
-    session.flush()
+        consultant_state.remove_project(consultant_id, current_date)
 
 def update_project_metadata(session, project, team, deliverables, target_hours):
     project_custom_data = session.query(ProjectCustomData).filter_by(ProjectID=project.ProjectID).first()
@@ -123,130 +343,134 @@ def distribute_monthly_targets(yearly_target):
     monthly_targets = [base_monthly_target] * 12
     middle_months = project_settings.PROJECT_MONTH_DISTRIBUTION
     for i in range(extra_projects):
-        month = random.choice(middle_months)
+        month = rng.choice(middle_months)
         monthly_targets[month] += 1
     
     return monthly_targets
 
 
-def start_due_projects(session, current_date):
+@counted
+def start_due_projects(session, current_date, consultant_state):
     due_projects = session.query(Project).filter(
         Project.Status == 'Not Started',
         Project.ActualStartDate <= current_date
     ).all()
 
     for project in due_projects:
-        project.Status = 'In Progress'
-        logging.info(f"Starting project {project.ProjectID} on {current_date}")
+        start_project(session, project, current_date, consultant_state)
 
-        project_custom_data = session.query(ProjectCustomData).get(project.ProjectID)
-        team_member_ids = project_custom_data.CustomData.get('team', [])
-        for consultant_id in team_member_ids:
-            existing_assignment = session.query(ProjectTeam).filter(
-                ProjectTeam.ProjectID == project.ProjectID,
-                ProjectTeam.ConsultantID == consultant_id
-            ).first()
+    end_step(session)
 
-            if not existing_assignment:
-                team_member = ProjectTeam(
-                    ProjectID=project.ProjectID,
-                    ConsultantID=consultant_id,
-                    Role='Team Member',
-                    StartDate=current_date
-                )
-                session.add(team_member)
-                update_consultant_custom_data(session, consultant_id, project.ProjectID, 'add', current_date)
-                logging.info(f"Assigned consultant {consultant_id} to project {project.ProjectID}")
+@counted
+def start_project(session, project, current_date, consultant_state):
+    project.Status = 'In Progress'
+    if log_enabled():
+        logging.info(f"Starting project {project.ProjectID} on {current_date}")
 
-    session.commit()     
+    project_custom_data = session.query(ProjectCustomData).get(project.ProjectID)
+    team_member_ids = project_custom_data.CustomData.get('team', [])
+    for consultant_id in team_member_ids:
+        existing_assignment = session.query(ProjectTeam).filter(
+            ProjectTeam.ProjectID == project.ProjectID,
+            ProjectTeam.ConsultantID == consultant_id
+        ).first()
+
+        if not existing_assignment:
+            team_member = ProjectTeam(
+                ProjectID=project.ProjectID,
+                ConsultantID=consultant_id,
+                Role='Team Member',
+                StartDate=current_date
+            )
+            session.add(team_member)
+            update_consultant_custom_data(consultant_state, consultant_id, project.ProjectID, 'add', current_date)
+            if log_enabled():
+                logging.info(f"Assigned consultant {consultant_id} to project {project.ProjectID}")
 
 
-def create_new_projects_if_needed(session, current_date, available_consultants, active_units, simulation_start_date, monthly_targets):
-    all_consultants = session.query(Consultant).all()
-    
-    project_manager_consultants = [c for c in all_consultants if session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('title_id', 0) >= 4]
-    
-    project_manager_consultants.sort(key=lambda c: (
-        session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('active_project_count', 0),
-        -session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('title_id', 0)
-    ))
-    
-    logging.info(f"Available project managers: {len(project_manager_consultants)}")
-    logging.info(f"Top 5 PM candidates: {[(c.ConsultantID, session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('title_id', 0), session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('active_project_count', 0)) for c in project_manager_consultants[:5]]}")
+@counted
+def create_new_projects_if_needed(session, current_date, availability, active_units, simulation_start_date, monthly_targets, consultant_state):
+    availability.advance(current_date)
+    project_manager_count = sum(availability.headcount[title] for title in PROJECT_MANAGER_TITLES)
+    if log_enabled():
+        logging.info(f"Available project managers: {project_manager_count}")
 
     target_for_month = monthly_targets[current_date.month - 1]
     
-    total_capacity = sum(max(0, project_settings.MAX_PROJECTS_PER_CONSULTANT.get(
-        session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('title_id', 1), 2) - 
-        session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('active_project_count', 0)
-    ) for c in project_manager_consultants)
+    total_capacity = availability.free_capacity(PROJECT_MANAGER_TITLES, project_settings.MAX_PROJECTS_PER_CONSULTANT)
     
     adjusted_target = max(0, min(target_for_month, total_capacity))
     
-    logging.info(f"Target for month: {target_for_month}, Adjusted target: {adjusted_target}, Total capacity: {total_capacity}")
+    if log_enabled():
+        logging.info(f"Target for month: {target_for_month}, Adjusted target: {adjusted_target}, Total capacity: {total_capacity}")
 
     if adjusted_target > 0:
         std_dev = max(0.1, adjusted_target * 0.2)
-        projects_to_create = max(0, round(norm.rvs(loc=adjusted_target, scale=std_dev)))
+        projects_to_create = max(0, round(norm.rvs(loc=adjusted_target, scale=std_dev, random_state=numpy_stream('projects'))))
     else:
         projects_to_create = 0
 
-    projects_this_month = len([p for p in session.query(Project).all() if 
-        session.query(ProjectCustomData).get(p.ProjectID).CustomData.get('start_date', date.min).month == current_date.month and 
-        session.query(ProjectCustomData).get(p.ProjectID).CustomData.get('start_date', date.min).year == current_date.year
-    ])
+    # Projects already planned to start this month count towards its target
+    month_start = current_date.replace(day=1)
+    projects_this_month = session.query(func.count(Project.ProjectID)).filter(
+        Project.PlannedStartDate >= month_start,
+        Project.PlannedStartDate < month_start + relativedelta(months=1)
+    ).scalar()
     projects_to_create = max(0, projects_to_create - projects_this_month)
 
-    logging.info(f"Target projects to create: {projects_to_create}")
+    if log_enabled():
+        logging.info(f"Target projects to create: {projects_to_create}")
 
     projects_created = 0
-    for consultant in project_manager_consultants:
-        if projects_created >= projects_to_create:
+    tried_managers = set()
+    while projects_created < projects_to_create:
+        # Least busy project manager with capacity left, senior titles first on ties
+        candidates = [c for title in PROJECT_MANAGER_TITLES
+                      for c in availability.pick(title, 1, exclude=tried_managers,
+                                                 max_projects=project_settings.MAX_PROJECTS_PER_CONSULTANT.get(title, 2))]
+        if not candidates:
             break
-        
-        consultant_custom_data = session.query(ConsultantCustomData).get(consultant.ConsultantID)
-        max_projects = project_settings.MAX_PROJECTS_PER_CONSULTANT.get(consultant_custom_data.CustomData.get('title_id', 1), 2)
-        if consultant_custom_data.CustomData.get('active_project_count', 0) >= max_projects:
-            continue
-
-        logging.info(f"Attempting to create project with PM: {consultant.ConsultantID} (Title: {consultant_custom_data.CustomData.get('title_id', 0)}, Active Projects: {consultant_custom_data.CustomData.get('active_project_count', 0)})")
-        project = create_new_project(session, current_date, all_consultants, active_units, simulation_start_date, project_manager=consultant)
+        consultant = min(candidates, key=lambda c: (
+            consultant_state.active_project_count(c.ConsultantID),
+            -consultant_state.title_id(c.ConsultantID)
+        ))
+        tried_managers.add(consultant.ConsultantID)
+
+        pm_state = consultant_state[consultant.ConsultantID]
+        if log_enabled():
+            logging.info(f"Attempting to create project with PM: {consultant.ConsultantID} (Title: {pm_state.title_id}, Active Projects: {pm_state.active_project_count})")
+        project = create_new_project(session, current_date, availability, active_units, simulation_start_date, consultant_state, project_manager=consultant)
         if project:
             projects_created += 1
 
             project_custom_data = session.query(ProjectCustomData).get(project.ProjectID)
             for consultant_id in project_custom_data.CustomData['team']:
-                update_consultant_custom_data(session, consultant_id, project.ProjectID, 'add', current_date)
-
-            available_consultants = [c for c in all_consultants if 
-                session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('active_project_count', 0) < 
-                project_settings.MAX_PROJECTS_PER_CONSULTANT.get(session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('title_id', 1), 2)
-            ]
-            available_consultants.sort(key=lambda c: (
-                session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('active_project_count', 0),
-                -session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('title_id', 0)
-            ))
-            logging.info(f"Successfully created project: ProjectID {project.ProjectID}")
+                update_consultant_custom_data(consultant_state, consultant_id, project.ProjectID, 'add', current_date)
+            if log_enabled():
+                logging.info(f"Successfully created project: ProjectID {project.ProjectID}")
         else:
             logging.warning(f"Failed to create new project with Project Manager: {consultant.ConsultantID}")
 
-    logging.info(f"Date: {current_date}, New Projects Created: {projects_created}, Target: {adjusted_target}, Available Project Managers: {len(project_manager_consultants)}")
-    return available_consultants
+    if log_enabled():
+        logging.info(f"Date: {current_date}, New Projects Created: {projects_created}, Target: {adjusted_target}, Available Project Managers: {project_manager_count}")
 
 
-def create_new_project(session, current_date, available_consultants, active_units, simulation_start_date, project_manager):
-    logging.info(f"Attempting to create new project with PM: {project_manager.ConsultantID} (Title: {project_manager.CustomData.CustomData.get('title_id', 'Unknown')})")
+@counted
+def create_new_project(session, current_date, availability, active_units, simulation_start_date, consultant_state, project_manager):
+    pm_title_id = consultant_state.title_id(project_manager.ConsultantID)
+    if log_enabled():
+        logging.info(f"Attempting to create new project with PM: {project_manager.ConsultantID} (Title: {pm_title_id})")
 
+    savepoint = begin_savepoint(session)
     try:
-        eligible_consultants = [c for c in available_consultants if c.CustomData.CustomData.get('title_id', 0) <= project_manager.CustomData.CustomData.get('title_id', 0)]
-        days_before = random.randint(0, 15)
+        days_before = rng.randint(0, 15)
         created_at = current_date - timedelta(days=days_before)
         created_at = max(created_at, simulation_start_date)
         project = Project(
-            ClientID=random.choice(session.query(Client.ClientID).all())[0],
-            UnitID=assign_project_to_business_unit(session, eligible_consultants, active_units, current_date.year),
-            Name=f"Project{current_date.year}{random.randint(1000, 9999)}",
-            Type=random.choices(project_settings.PROJECT_TYPES, weights=project_settings.PROJECT_TYPE_WEIGHTS)[0],
+            ClientID=rng.choice(session.query(Client.ClientID).all())[0],
+            UnitID=assign_project_to_business_unit(session, availability.unit_counts(pm_title_id), active_units, current_date.year),
+            Name=f"Project{current_date.year}{rng.randint(1000, 9999)}",
+            Type=rng.choices(project_settings.PROJECT_TYPES, weights=project_settings.PROJECT_TYPE_WEIGHTS)[0],
             Status='Not Started',
             Progress=0,
             EstimatedBudget=None,
@@ -256,7 +480,8 @@ def create_new_project(session, current_date, available_consultants, active_unit
 
         session.add(project)
         session.flush()
-        logging.info(f"Created project: ProjectID {project.ProjectID}")
+        if log_enabled():
+            logging.info(f"Created project: ProjectID {project.ProjectID}")
 
         target_team_size = set_project_dates(project, current_date, project_manager, session, simulation_start_date)
         project.PlannedHours = calculate_planned_hours(project, target_team_size)
@@ -264,14 +489,14 @@ def create_new_project(session, current_date, available_consultants, active_unit
         project.ActualHours = 0
 
         # Assign initial team members
-        assigned_consultants, remaining_slots = assign_consultants_to_project(session, eligible_consultants, project_manager, target_team_size)
+        assigned_consultants, remaining_slots = assign_consultants_to_project(consultant_state, availability, project_manager, target_team_size)
 
         deliverables = generate_deliverables(project, target_hours)
         session.add_all(deliverables)
         session.flush()
 
         # Calculate project financials and generate predefined expenses
-        estimated_total_cost, estimated_total_revenue, predefined_expenses = calculate_project_financials(session, project, assigned_consultants, current_date, deliverables)
+        estimated_total_cost, estimated_total_revenue, predefined_expenses = calculate_project_financials(session, project, assigned_consultants, current_date, deliverables, consultant_state)
 
         # Initialize project custom_data
         custom_data = {
@@ -302,7 +527,7 @@ def create_new_project(session, current_date, available_consultants, active_unit
         # Set up billing rates for all title levels
         if project.Type == 'Time and Material':
             for title_id in range(1, 7):  # Assuming title IDs range from 1 to 6
-                avg_experience = calculate_average_experience(session, title_id, current_date)
+                avg_experience = calculate_average_experience(consultant_state, title_id, current_date)
                 rate = calculate_billing_rate(title_id, project.Type, avg_experience)
                 billing_rate = ProjectBillingRate(
                     ProjectID=project.ProjectID,
@@ -312,22 +537,26 @@ def create_new_project(session, current_date, available_consultants, active_unit
                 session.add(billing_rate)
             session.flush()
 
-        assign_project_team(session, project, assigned_consultants)
+        assign_project_team(session, project, assigned_consultants, consultant_state)
         session.flush()
 
-        logging.info(f"Project {project.ProjectID} created with {len(assigned_consultants)} consultants. "
-                     f"Target team size: {target_team_size}, Remaining slots: {remaining_slots}, "
-                     f"Predefined expenses: {len(predefined_expenses)}")
+        if log_enabled():
+            logging.info(f"Project {project.ProjectID} created with {len(assigned_consultants)} consultants. "
+                         f"Target team size: {target_team_size}, Remaining slots: {remaining_slots}, "
+                         f"Predefined expenses: {len(predefined_expenses)}")
 
+        savepoint.commit()
         return project
     except Exception as e:
         logging.error(f"Error creating new project: {str(e)}")
         print(traceback.format_exc())
-        session.rollback()
+        savepoint.rollback()
         return None
 
 
-def update_existing_projects(session, current_date, available_consultants):
+@counted
+def update_existing_projects(session, current_date, availability, consultant_state, working_set):
+    availability.advance(current_date)
     active_projects = session.query(Project).filter(
         Project.Status.in_(['Not Started', 'In Progress']),
         Project.PlannedStartDate <= current_date,
@@ -335,6 +564,7 @@ def update_existing_projects(session, current_date, available_consultants):
     ).all()
 
     for project in active_projects:
+        savepoint = begin_savepoint(session)
         try:
             if project.Status == 'Not Started' and project.PlannedStartDate <= current_date:
                 project.Status = 'In Progress'
@@ -348,7 +578,7 @@ def update_existing_projects(session, current_date, available_consultants):
 
             # Update project team if needed
             current_team = project_custom_data.CustomData.get('team', [])
-            update_project_team(session, project, available_consultants, current_team, current_date)
+            update_project_team(session, project, availability, current_team, current_date, consultant_state)
 
             # Update the project custom data
             project_custom_data.CustomData['team'] = current_team
@@ -356,149 +586,155 @@ def update_existing_projects(session, current_date, available_consultants):
 
         except Exception as e:
             logging.error(f"Error updating project {project.ProjectID}: {str(e)}")
-            session.rollback()
+            savepoint.rollback()
         else:
-            session.commit()
-
-def generate_daily_consultant_deliverables(session, current_date, projects):
-    consultant_daily_hours = defaultdict(float)
+            savepoint.commit()
+            # Consultants added to the team start logging hours on the next workday
+            working_set.set_team(project.ProjectID, current_team)
+            end_step(session)
+
+@counted
+def generate_daily_consultant_deliverables(session, current_date, projects, consultant_state, working_set, timesheet_writer):
+    # Timesheet rows are buffered and written in chunks or with the month-end commit.
+    # Hours are counted in integer tenths here and only turned back into floats on the models.
+    consultant_daily_tenths = defaultdict(int)
+    work_date = current_date.isoformat()
     
     active_projects = [p for p in projects if p.Status == 'In Progress']
-    random.shuffle(active_projects)
+    rng.shuffle(active_projects)
     
     for project in active_projects:
-        project_actual_hours = Decimal('0.0')
-        project_custom_data = session.query(ProjectCustomData).filter_by(ProjectID=project.ProjectID).first()
-        if not project_custom_data:
+        project_actual_tenths = 0
+        project_state = working_set.get(session, project.ProjectID)
+        if not project_state:
             continue
 
-        predefined_expenses = project_custom_data.CustomData.get('predefined_expenses', [])
-
-        for deliverable_id, deliverable_meta in project_custom_data.CustomData.get('deliverables', {}).items():
-            deliverable = session.query(Deliverable).get(deliverable_id)
-            if deliverable.Status == 'Completed' or deliverable.PlannedStartDate > current_date:
+        for deliverable in project_state.deliverables:
+            if deliverable.status == 'Completed' or deliverable.planned_start_date > current_date:
                 continue
 
-            if deliverable.Status == 'Not Started':
-                deliverable.ActualStartDate = current_date
-                deliverable.Status = 'In Progress'
+            if deliverable.status == 'Not Started':
+                deliverable.actual_start_date = current_date
+                deliverable.status = 'In Progress'
+                working_set.mark(deliverable)
 
-            remaining_hours = Decimal(str(deliverable_meta['target_hours'])) - Decimal(str(deliverable.ActualHours))
+            remaining_tenths = deliverable.target_tenths - deliverable.actual_tenths
 
-            if remaining_hours <= Decimal('0.0'):
+            if remaining_tenths <= 0:
                 continue
 
-            for consultant_id in project_custom_data.CustomData.get('team', []):
-                consultant_custom_data = session.query(ConsultantCustomData).filter_by(ConsultantID=consultant_id).first()
-                if not consultant_custom_data:
+            for consultant_id in project_state.team:
+                if consultant_id not in consultant_state:
                     continue
-                consultant_title = consultant_custom_data.CustomData.get('title_id', 1)
-                max_daily_hours = Decimal(str(project_settings.MAX_DAILY_HOURS_PER_TITLE.get(consultant_title, 8.0)))
-                min_daily_hours = Decimal(str(project_settings.MIN_DAILY_HOURS_PER_PROJECT.get(consultant_title, 2.0)))
+                consultant_title = consultant_state.title_id(consultant_id)
+                max_daily_tenths = MAX_DAILY_TENTHS.get(consultant_title, DEFAULT_MAX_DAILY_TENTHS)
+                min_daily_tenths = MIN_DAILY_TENTHS.get(consultant_title, DEFAULT_MIN_DAILY_TENTHS)
 
-                if consultant_daily_hours[consultant_id] >= max_daily_hours:
+                if consultant_daily_tenths[consultant_id] >= max_daily_tenths:
                     continue
 
-                consultant_hours_today = Decimal(str(consultant_daily_hours[consultant_id]))
-                available_hours = min(max_daily_hours - consultant_hours_today, remaining_hours)
+                available_tenths = min(max_daily_tenths - consultant_daily_tenths[consultant_id], remaining_tenths)
 
-                if available_hours <= Decimal('0.0'):
+                if available_tenths <= 0:
                     continue
 
-                hours = round_decimal(Decimal(str(random.uniform(float(min_daily_hours), float(available_hours)))), 1)
-                consultant_deliverable = ConsultantDeliverable(
-                    ConsultantID=consultant_id,
-                    DeliverableID=deliverable_id,
-                    Date=current_date,
-                    Hours=float(hours)
-                )
-                session.add(consultant_deliverable)
-                remaining_hours -= hours
-                deliverable.ActualHours = float(round_decimal(Decimal(str(deliverable.ActualHours)) + hours, 1))
-                project_actual_hours += hours
-                consultant_daily_hours[consultant_id] += float(hours)
-
-
-            deliverable.Progress = min(100, int((Decimal(str(deliverable.ActualHours)) / Decimal(str(deliverable_meta['target_hours']))) * 100))
-
-        project.ActualHours = float(round_decimal(Decimal(str(project.ActualHours)) + project_actual_hours, 1))
-        project.Progress = min(100, int((Decimal(str(project.ActualHours)) / Decimal(str(project_custom_data.CustomData['target_hours']))) * 100))
-
-    session.commit()
-
-def update_project_statuses(session, current_date, available_consultants):
-    projects = session.query(Project).all()
+                tenths = to_tenths(rng.uniform(from_tenths(min_daily_tenths), from_tenths(available_tenths)))
+                timesheet_writer.append((consultant_id, deliverable.deliverable_id, work_date, from_tenths(tenths)))
+                remaining_tenths -= tenths
+                deliverable.actual_tenths += tenths
+                project_actual_tenths += tenths
+                consultant_daily_tenths[consultant_id] += tenths
+
+            deliverable.progress = min(100, deliverable.actual_tenths * 100 // deliverable.target_tenths)
+            working_set.mark(deliverable)
+
+        project_actual_tenths += to_tenths(project.ActualHours)
+        project.ActualHours = from_tenths(project_actual_tenths)
+        project.Progress = min(100, project_actual_tenths * 100 // project_state.target_tenths)
+
+@counted
+def update_project_statuses(session, current_date, consultant_state, working_set, projects=None):
+    '''
+    Progress and completion of the given projects (all projects by default).
+    Returns the IDs of the projects completed or cancelled on current_date.
+    '''
+    if projects is None:
+        projects = session.query(Project).all()
+    closed = []
     for project in projects:
         if project.Status in ['Completed', 'Cancelled']:
             continue
 
         if project.Status == 'Not Started' and current_date >= project.ActualStartDate:
             project.Status = 'In Progress'
-            logging.info(f"Starting project {project.ProjectID} on {current_date}")
+            if log_enabled():
+                logging.info(f"Starting project {project.ProjectID} on {current_date}")
 
         if project.Status == 'In Progress':
-            project_custom_data = session.query(ProjectCustomData).get(project.ProjectID)
-            total_target_hours = Decimal(str(project_custom_data.CustomData.get('target_hours', 0)))
-            total_actual_hours = Decimal('0.0')
+            project_state = working_set.get(session, project.ProjectID)
+            total_actual_tenths = 0
             all_deliverables_completed = True
-            weighted_progress = Decimal('0.0')
-
-            for deliverable_id, deliverable_meta in project_custom_data.CustomData.get('deliverables', {}).items():
-                deliverable = session.query(Deliverable).get(deliverable_id)
-                deliverable_target_hours = Decimal(str(deliverable_meta['target_hours']))
-                deliverable_actual_hours = Decimal(str(deliverable.ActualHours))
-
-                total_actual_hours += deliverable_actual_hours
-
-                if deliverable_actual_hours >= deliverable_target_hours:
-                    deliverable.Status = 'Completed'
-                    deliverable.Progress = 100
-                    if not deliverable.SubmissionDate:
-                        deliverable.SubmissionDate = current_date
-                    if project.Type == 'Fixed' and not deliverable.InvoicedDate:
-                        deliverable.InvoicedDate = current_date + timedelta(days=random.randint(1, 7))
-                elif deliverable_actual_hours > Decimal('0.0'):
-                    deliverable.Status = 'In Progress'
-                    deliverable.Progress = min(99, int((deliverable_actual_hours / deliverable_target_hours) * 100))
+            # Sum of progress x target tenths; divided by the project target once at the end
+            weighted_progress = 0
+
+            for deliverable in project_state.deliverables:
+                total_actual_tenths += deliverable.actual_tenths
+
+                if deliverable.actual_tenths >= deliverable.target_tenths:
+                    deliverable.status = 'Completed'
+                    deliverable.progress = 100
+                    if not deliverable.submission_date:
+                        deliverable.submission_date = current_date
+                    if project.Type == 'Fixed' and not deliverable.invoiced_date:
+                        deliverable.invoiced_date = current_date + timedelta(days=rng.randint(1, 7))
+                elif deliverable.actual_tenths > 0:
+                    deliverable.status = 'In Progress'
+                    deliverable.progress = min(99, deliverable.actual_tenths * 100 // deliverable.target_tenths)
                     all_deliverables_completed = False
                 else:
-                    deliverable.Status = 'Not Started'
-                    deliverable.Progress = 0
+                    deliverable.status = 'Not Started'
+                    deliverable.progress = 0
                     all_deliverables_completed = False
+                working_set.mark(deliverable)
 
-                deliverable_weight = deliverable_target_hours / total_target_hours
-                weighted_progress += Decimal(str(deliverable.Progress)) * deliverable_weight
+                weighted_progress += deliverable.progress * deliverable.target_tenths
 
-            project.ActualHours = float(total_actual_hours)
-            project.Progress = min(99, int(weighted_progress))
+            project.ActualHours = from_tenths(total_actual_tenths)
+            project.Progress = min(99, weighted_progress // project_state.target_tenths)
 
-            if total_actual_hours == Decimal('0.0') and current_date > project.ActualStartDate + timedelta(days=120):
+            if total_actual_tenths == 0 and current_date > project.ActualStartDate + timedelta(days=120):
                 project.Status = 'Cancelled'
                 project.ActualEndDate = current_date
+                working_set.discard(project.ProjectID)
+                closed.append(project.ProjectID)
                 logging.warning(f"Project {project.ProjectID} cancelled due to inactivity")
             elif all_deliverables_completed or project.Progress >= 99:
                 project.Status = 'Completed'
                 project.Progress = 100
                 project.ActualEndDate = current_date
-                handle_project_completion(session, project, current_date, available_consultants)
+                handle_project_completion(session, project, current_date, consultant_state, working_set)
+                closed.append(project.ProjectID)
 
-    session.commit()
+    end_step(session)
+    return closed
 
-def handle_project_completion(session, project, completion_date, available_consultants):
+@counted
+def handle_project_completion(session, project, completion_date, consultant_state, working_set):
     # Update project status and end date
     project.Status = 'Completed'
     project.ActualEndDate = completion_date
     project.Progress = 100
 
     # Ensure all deliverables are marked as completed
-    deliverables = session.query(Deliverable).filter(Deliverable.ProjectID == project.ProjectID).all()
-    for deliverable in deliverables:
-        deliverable.Status = 'Completed'
-        deliverable.Progress = 100
-        if not deliverable.SubmissionDate:
-            deliverable.SubmissionDate = completion_date
-        if project.Type == 'Fixed' and not deliverable.InvoicedDate:
-            deliverable.InvoicedDate = completion_date + timedelta(days=random.randint(1, 7))
+    for deliverable in working_set.get(session, project.ProjectID).deliverables:
+        deliverable.status = 'Completed'
+        deliverable.progress = 100
+        if not deliverable.submission_date:
+            deliverable.submission_date = completion_date
+        if project.Type == 'Fixed' and not deliverable.invoiced_date:
+            deliverable.invoiced_date = completion_date + timedelta(days=rng.randint(1, 7))
+        working_set.mark(deliverable)
+    working_set.discard(project.ProjectID)
 
     # Update ProjectTeam records
     team_members = session.query(ProjectTeam).filter(
@@ -508,14 +744,8 @@ def handle_project_completion(session, project, completion_date, available_consu
 
     for team_member in team_members:
         team_member.EndDate = completion_date
-        update_consultant_custom_data(session, team_member.ConsultantID, project.ProjectID, 'remove', completion_date)
-
-        # Add consultant back to available pool if not at max projects
-        consultant_custom_data = session.query(ConsultantCustomData).get(team_member.ConsultantID)
-        max_projects = project_settings.MAX_PROJECTS_PER_CONSULTANT.get(consultant_custom_data.CustomData.get('title_id', 1), 2)
-        if consultant_custom_data.CustomData.get('active_project_count', 0) < max_projects:
-            consultant = session.query(Consultant).get(team_member.ConsultantID)
-            if consultant not in available_consultants:
-                available_consultants.append(consultant)
+        # Frees a slot in the availability tracker as well
+        update_consultant_custom_data(consultant_state, team_member.ConsultantID, project.ProjectID, 'remove', completion_date)
 
-    logging.info(f"Project {project.ProjectID} completed on {completion_date}")                                                                                                                                        
\ No newline at end of file
+    if log_enabled():
+        logging.info(f"Project {project.ProjectID} completed on {completion_date}")
\ No newline at end of file
@@ -0,0 +1,190 @@
+import os
+import json
+import shutil
+import sqlite3
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import text
+from models.db_model import Base, engine, create_db_engine
+from config.path_config import db_path
+from config import project_settings
+from .project_deliverable import generate_projects
+from ..utils.random_streams import set_seed, worker_seed
+
+shard_dir = os.path.join(db_path, 'shards')
+
+# All shards are attached to one connection to merge them in a single transaction,
+# and SQLite attaches at most 10 databases by default
+MAX_SHARDS = 10
+
+# Tables written by the project simulation, in merge order. Each maps the columns that
+# hold generated IDs to the table whose ID range they belong to.
+SHARD_ID_COLUMNS = {
+    'Project': {'ProjectID': 'Project'},
+    'Deliverable': {'DeliverableID': 'Deliverable', 'ProjectID': 'Project'},
+    'ProjectBillingRate': {'BillingRateID': 'ProjectBillingRate', 'ProjectID': 'Project'},
+    'ProjectTeam': {'ID': 'ProjectTeam', 'ProjectID': 'Project'},
+    'ProjectExpense': {'ProjectExpenseID': 'ProjectExpense', 'ProjectID': 'Project', 'DeliverableID': 'Deliverable'},
+    'Consultant_Deliverable': {'ID': 'Consultant_Deliverable', 'DeliverableID': 'Deliverable'},
+}
+
+def plan_shards(connection, workers):
+    '''
+    Split business units into at most `workers` groups with similar consultant counts.
+    Returns a list of (unit_ids, consultant_count), largest group first.
+    '''
+    unit_counts = connection.execute(text('''
+        SELECT bu.BusinessUnitID, COUNT(c.ConsultantID)
+        FROM BusinessUnit bu
+        LEFT JOIN Consultant c ON c.BusinessUnitID = bu.BusinessUnitID
+        GROUP BY bu.BusinessUnitID
+        ORDER BY COUNT(c.ConsultantID) DESC, bu.BusinessUnitID
+    ''')).all()
+
+    groups = [([], 0) for _ in range(max(1, workers))]
+    for unit_id, count in unit_counts:
+        if count == 0:
+            continue
+        index = min(range(len(groups)), key=lambda i: groups[i][1])
+        unit_ids, total = groups[index]
+        groups[index] = (unit_ids + [unit_id], total + count)
+    return [group for group in groups if group[0]]
+
+def copy_database(path):
+    '''Snapshot the main database to path with the SQLite backup API (works for in-memory engines too).'''
+    source = engine.raw_connection()
+    target = sqlite3.connect(path)
+    try:
+        source.dbapi_connection.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+def prune_shard(connection, unit_ids):
+    # Keep only the shard's business units and the consultants that belong to them
+    placeholders = ', '.join(str(int(unit_id)) for unit_id in unit_ids)
+    others = f"SELECT ConsultantID FROM Consultant WHERE BusinessUnitID NOT IN ({placeholders})"
+    for table in ['ConsultantCustomData', 'Payroll', 'Consultant_Title_History']:
+        connection.execute(text(f'DELETE FROM "{table}" WHERE ConsultantID IN ({others})'))
+    connection.execute(text(f"DELETE FROM Consultant WHERE BusinessUnitID NOT IN ({placeholders})"))
+    connection.execute(text(f"DELETE FROM BusinessUnit WHERE BusinessUnitID NOT IN ({placeholders})"))
+
+def run_shard(shard_path, unit_ids, start_year, end_year, initial_consultants, mode, seed):
+    '''Worker entry point: simulate the projects of unit_ids inside the shard at shard_path.'''
+    set_seed(*seed)
+    shard_engine = create_db_engine(path=shard_path, in_memory=False, exclusive=False)
+    try:
+        with shard_engine.begin() as connection:
+            prune_shard(connection, unit_ids)
+        print(f"Shard {os.path.basename(shard_path)}: units {unit_ids}, {initial_consultants} initial consultants")
+        if not generate_projects(start_year, end_year, initial_consultants, mode=mode, bind=shard_engine):
+            # A rolled back shard must not be merged; fail the whole run instead
+            raise RuntimeError(f"Project simulation failed in shard {os.path.basename(shard_path)}")
+    finally:
+        shard_engine.dispose()
+    return shard_path
+
+def remap_project_custom_data(custom_data, offsets):
+    data = json.loads(custom_data) if isinstance(custom_data, str) else custom_data
+    if 'deliverables' in data:
+        data['deliverables'] = {str(int(deliverable_id) + offsets['Deliverable']): meta
+                                for deliverable_id, meta in data['deliverables'].items()}
+    for expense in data.get('predefined_expenses', []):
+        if expense.get('DeliverableID') is not None:
+            expense['DeliverableID'] += offsets['Deliverable']
+    return json.dumps(data)
+
+def merge_shard(connection, schema):
+    '''
+    Append the project tables of the shard attached as schema to the main database,
+    shifting every generated ID past the IDs already there so shards never collide.
+    '''
+    tables = Base.metadata.tables
+    offsets = {}
+    for table_name in SHARD_ID_COLUMNS:
+        primary_key = tables[table_name].primary_key.columns.values()[0].name
+        offsets[table_name] = connection.exec_driver_sql(
+            f'SELECT COALESCE(MAX("{primary_key}"), 0) FROM main."{table_name}"'
+        ).scalar()
+
+    for table_name, id_columns in SHARD_ID_COLUMNS.items():
+        columns = [column.name for column in tables[table_name].columns]
+        select_list = ', '.join(
+            f'"{column}" + {offsets[id_columns[column]]}' if column in id_columns else f'"{column}"'
+            for column in columns
+        )
+        column_list = ', '.join(f'"{column}"' for column in columns)
+        connection.exec_driver_sql(
+            f'INSERT INTO main."{table_name}" ({column_list}) SELECT {select_list} FROM {schema}."{table_name}"'
+        )
+
+    # Deliverable IDs are also embedded in the project JSON
+    rows = connection.exec_driver_sql(f'SELECT ProjectID, CustomData FROM {schema}.ProjectCustomData').all()
+    if rows:
+        connection.exec_driver_sql(
+            'INSERT INTO main.ProjectCustomData (ProjectID, CustomData) VALUES (?, ?)',
+            [(project_id + offsets['Project'], remap_project_custom_data(custom_data, offsets))
+             for project_id, custom_data in rows]
+        )
+
+    # The shard only holds its own consultants, whose project state it owns
+    connection.exec_driver_sql(
+        'INSERT OR REPLACE INTO main.ConsultantCustomData (ConsultantID, CustomData) '
+        f'SELECT ConsultantID, CustomData FROM {schema}.ConsultantCustomData'
+    )
+
+def merge_shards(connection, shard_paths):
+    '''
+    Merge every shard in one transaction, so a failure leaves the main database as it
+    was. SQLite cannot detach inside a transaction, so all shards are attached first.
+    '''
+    schemas = []
+    try:
+        for index, shard_path in enumerate(shard_paths):
+            connection.exec_driver_sql(f"ATTACH DATABASE ? AS shard_{index}", (shard_path,))
+            schemas.append(f'shard_{index}')
+        for schema in schemas:
+            merge_shard(connection, schema)
+        connection.commit()
+    finally:
+        connection.rollback()
+        for schema in schemas:
+            connection.exec_driver_sql(f"DETACH DATABASE {schema}")
+
+def generate_projects_sharded(start_year, end_year, initial_consultants, workers=project_settings.SIMULATION_WORKERS,
+                              mode=project_settings.SIMULATION_MODE):
+    with engine.connect() as connection:
+        if connection.execute(text('SELECT COUNT(*) FROM Project')).scalar():
+            raise ValueError("Sharded project simulation needs an empty Project table")
+        shards = plan_shards(connection, min(workers, MAX_SHARDS))
+        total_consultants = sum(count for _, count in shards)
+
+    if len(shards) <= 1:
+        print("Only one business unit has consultants; running the project simulation in a single process")
+        generate_projects(start_year, end_year, initial_consultants, mode=mode)
+        return
+
+    print(f"Generating Project Data in {len(shards)} shards: {[unit_ids for unit_ids, _ in shards]}")
+    os.makedirs(shard_dir, exist_ok=True)
+    jobs = []
+    for index, (unit_ids, count) in enumerate(shards):
+        shard_path = os.path.join(shard_dir, f'shard_{index}.db')
+        copy_database(shard_path)
+        # Project targets scale with the share of the firm simulated in the shard
+        shard_initial = max(1, round(initial_consultants * count / total_consultants))
+        jobs.append((shard_path, unit_ids, start_year, end_year, shard_initial, mode, worker_seed(f'shard-{index}')))
+
+    try:
+        # Fresh interpreters: no inherited connections; each shard seeds its own streams
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(jobs), mp_context=context) as executor:
+            futures = [executor.submit(run_shard, *job) for job in jobs]
+            # Raises if any shard failed, before anything is merged
+            shard_paths = [future.result() for future in futures]
+
+        print("Merging shards...")
+        with engine.connect() as connection:
+            merge_shards(connection, shard_paths)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    print("Complete")
@@ -0,0 +1,47 @@
+from sqlalchemy import event
+
+
+class BulkInsertBuffer:
+    '''
+    Collects rows as plain tuples and writes them with a single executemany per chunk,
+    bypassing the ORM unit of work. Rows are flushed when the buffer reaches chunk_size
+    and before the bound session commits; a rollback discards unflushed rows.
+    '''
+    def __init__(self, model, columns, chunk_size=10000):
+        table = model.__table__
+        self.columns = list(columns)
+        self.chunk_size = chunk_size
+        self.statement = 'INSERT INTO "{}" ({}) VALUES ({})'.format(
+            table.name,
+            ', '.join(f'"{column}"' for column in self.columns),
+            ', '.join('?' for _ in self.columns)
+        )
+        self.rows = []
+        self.rows_written = 0
+        self.session = None
+
+    def bind(self, session):
+        self.session = session
+        event.listen(session, 'before_commit', self.flush)
+        event.listen(session, 'after_rollback', self.discard)
+        return self
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def flush(self, session=None):
+        if not self.rows:
+            return
+        session = session or self.session
+        session.connection().exec_driver_sql(self.statement, self.rows)
+        self.rows_written += len(self.rows)
+        self.rows = []
+
+    def discard(self, session=None):
+        self.rows = []
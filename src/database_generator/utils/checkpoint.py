@@ -0,0 +1,58 @@
+'''
+Month-boundary checkpoints for the project simulation. The checkpoint row is written
+in the same transaction as the month's data, so the database never holds simulated
+months that the checkpoint doesn't describe.
+'''
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from models.db_model import SimulationCheckpoint
+from .random_streams import get_state, set_state
+
+CHECKPOINT_ID = 1
+
+
+def save_checkpoint(session, mode, start_year, year, month, monthly_targets):
+    session.merge(SimulationCheckpoint(
+        ID=CHECKPOINT_ID,
+        Mode=mode,
+        StartYear=start_year,
+        Year=year,
+        Month=month,
+        State={
+            'monthly_targets': list(monthly_targets),
+            'random_state': get_state()
+        }
+    ))
+
+def load_checkpoint(session):
+    return session.get(SimulationCheckpoint, CHECKPOINT_ID)
+
+def clear_checkpoint(session):
+    session.query(SimulationCheckpoint).delete()
+
+def has_checkpoint(engine):
+    from sqlalchemy import inspect
+    from sqlalchemy.orm import Session
+    if not inspect(engine).has_table(SimulationCheckpoint.__tablename__):
+        return False
+    with Session(engine) as session:
+        return load_checkpoint(session) is not None
+
+
+class ResumePoint:
+    '''
+    Where a resumed simulation picks up: the first day after the checkpointed month,
+    with the month's targets and random streams restored.
+    '''
+    def __init__(self, session, checkpoint, mode, start_year):
+        if checkpoint.Mode != mode or checkpoint.StartYear != start_year:
+            raise ValueError(f"Checkpoint was written by a '{checkpoint.Mode}' run starting {checkpoint.StartYear}, "
+                             f"cannot resume it as a '{mode}' run starting {start_year}")
+        self.year = checkpoint.Year
+        self.month = checkpoint.Month
+        self.resume_date = date(self.year, self.month, 1) + relativedelta(months=1)
+        self.monthly_targets = checkpoint.State['monthly_targets']
+        set_state(checkpoint.State['random_state'])
+
+    def is_done(self, year, month):
+        return (year, month) <= (self.year, self.month)
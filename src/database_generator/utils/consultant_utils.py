@@ -0,0 +1,336 @@
+import heapq
+from dataclasses import dataclass
+from datetime import date, timedelta
+from collections import defaultdict, Counter
+from sqlalchemy import event, func, cast, Integer
+from models.db_model import Consultant, ConsultantCustomData, ConsultantTitleHistory
+
+
+def format_consultant_id(number):
+    return f"C{number:04d}"
+
+
+def last_simulated_year(session):
+    '''Last year in the database; every consultant still employed gets a record starting Jan 1 of each year.'''
+    last_start = session.query(func.max(ConsultantTitleHistory.StartDate)).scalar()
+    return last_start.year if last_start else None
+
+def active_headcount(session):
+    return session.query(func.count(ConsultantTitleHistory.ID)).filter(ConsultantTitleHistory.EndDate.is_(None)).scalar()
+
+
+class ConsultantIdAllocator:
+    '''
+    Hands out sequential consultant IDs. Seeded once from the highest ID in the
+    database so hiring never has to count existing consultants.
+    '''
+    def __init__(self, last_number=0):
+        self.last_number = last_number
+
+    @classmethod
+    def from_session(cls, session):
+        last_number = session.query(
+            func.max(cast(func.substr(Consultant.ConsultantID, 2), Integer))
+        ).scalar()
+        return cls(last_number or 0)
+
+    def reserve(self, count):
+        '''Reserve a block of count IDs and return them in order.'''
+        first = self.last_number + 1
+        self.last_number += max(0, count)
+        return [format_consultant_id(number) for number in range(first, self.last_number + 1)]
+
+
+class TitleHistoryIndex:
+    '''
+    ConsultantTitleHistory records grouped by consultant, with a pointer to each
+    consultant's open record (EndDate is None). Keeps insertion order in all_records.
+    '''
+    def __init__(self):
+        self.all_records = []
+        self.by_consultant = defaultdict(list)
+        self.open_records = {}
+
+    def __len__(self):
+        return len(self.all_records)
+
+    def append(self, record):
+        self.all_records.append(record)
+        self.by_consultant[record.ConsultantID].append(record)
+        if record.EndDate is None:
+            self.open_records[record.ConsultantID] = record
+        return record
+
+    def open_record(self, consultant_id):
+        return self.open_records.get(consultant_id)
+
+    def close(self, consultant_id, end_date):
+        record = self.open_records.pop(consultant_id)
+        record.EndDate = end_date
+        return record
+
+    def for_consultant(self, consultant_id):
+        return self.by_consultant.get(consultant_id, [])
+
+
+@dataclass
+class ConsultantState:
+    title_id: int = 1
+    active_project_count: int = 0
+    last_project_date: date = None
+    hire_year: int = None
+
+    def to_custom_data(self):
+        return {
+            'title_id': self.title_id,
+            'active_project_count': self.active_project_count,
+            'last_project_date': self.last_project_date.isoformat() if self.last_project_date else None
+        }
+
+
+class ConsultantStateRegistry:
+    '''
+    In-process copy of the ConsultantCustomData JSON column.
+    Loaded once per simulation run, written back only when the bound session commits
+    and restored to the last committed values when the session rolls back.
+    '''
+    def __init__(self, states=None):
+        self.states = states or {}
+        self._dirty = set()
+        self._new = set()
+        self._undo = {}
+        self._listeners = []
+
+    @classmethod
+    def load(cls, session):
+        rows = session.query(
+            Consultant.ConsultantID, Consultant.HireYear, ConsultantCustomData.CustomData
+        ).outerjoin(
+            ConsultantCustomData, Consultant.ConsultantID == ConsultantCustomData.ConsultantID
+        ).all()
+
+        registry = cls()
+        for consultant_id, hire_year, custom_data in rows:
+            if custom_data is None:
+                registry._new.add(consultant_id)
+                registry._dirty.add(consultant_id)
+                custom_data = {}
+            last_project_date = custom_data.get('last_project_date')
+            registry.states[consultant_id] = ConsultantState(
+                title_id=custom_data.get('title_id', 1),
+                active_project_count=custom_data.get('active_project_count', 0),
+                last_project_date=date.fromisoformat(last_project_date) if last_project_date else None,
+                hire_year=hire_year
+            )
+        return registry
+
+    def bind(self, session):
+        event.listen(session, 'before_commit', self.sync)
+        event.listen(session, 'after_rollback', self._restore)
+        return self
+
+    def subscribe(self, listener):
+        '''Call listener(consultant_id) after a consultant's state changes.'''
+        self._listeners.append(listener)
+
+    def _changed(self, consultant_id):
+        for listener in self._listeners:
+            listener(consultant_id)
+
+    def __getitem__(self, consultant_id):
+        return self.states[consultant_id]
+
+    def __contains__(self, consultant_id):
+        return consultant_id in self.states
+
+    def title_id(self, consultant_id):
+        return self.states[consultant_id].title_id
+
+    def active_project_count(self, consultant_id):
+        return self.states[consultant_id].active_project_count
+
+    def consultants_with_title(self, title_id):
+        return [state for state in self.states.values() if state.title_id == title_id]
+
+    def _touch(self, consultant_id):
+        state = self.states.get(consultant_id)
+        if state is None:
+            state = self.states[consultant_id] = ConsultantState()
+            self._new.add(consultant_id)
+            self._undo.setdefault(consultant_id, None)
+        elif consultant_id not in self._undo:
+            self._undo[consultant_id] = ConsultantState(**vars(state))
+        self._dirty.add(consultant_id)
+        return state
+
+    def update(self, consultant_id, **fields):
+        state = self._touch(consultant_id)
+        for name, value in fields.items():
+            setattr(state, name, value)
+        self._changed(consultant_id)
+        return state
+
+    def add_project(self, consultant_id, current_date):
+        state = self._touch(consultant_id)
+        state.active_project_count += 1
+        state.last_project_date = current_date
+        self._changed(consultant_id)
+
+    def remove_project(self, consultant_id, current_date):
+        state = self._touch(consultant_id)
+        state.active_project_count = max(0, state.active_project_count - 1)
+        state.last_project_date = current_date
+        self._changed(consultant_id)
+
+    def sync(self, session):
+        if not self._dirty:
+            return
+        updates = [{'ConsultantID': cid, 'CustomData': self.states[cid].to_custom_data()}
+                   for cid in sorted(self._dirty) if cid not in self._new]
+        inserts = [{'ConsultantID': cid, 'CustomData': self.states[cid].to_custom_data()}
+                   for cid in sorted(self._dirty) if cid in self._new]
+        if updates:
+            session.bulk_update_mappings(ConsultantCustomData, updates)
+        if inserts:
+            session.bulk_insert_mappings(ConsultantCustomData, inserts)
+        self._dirty.clear()
+        self._new.clear()
+        self._undo.clear()
+
+    def _restore(self, session):
+        for consultant_id, previous in self._undo.items():
+            if previous is None:
+                self.states.pop(consultant_id, None)
+                self._new.discard(consultant_id)
+            else:
+                self.states[consultant_id] = previous
+        # Rows that never existed in the database still need to be inserted
+        self._dirty = set(self._new)
+        restored, self._undo = self._undo, {}
+        for consultant_id in restored:
+            self._changed(consultant_id)
+
+
+class AvailabilityTracker:
+    '''
+    Employed consultants grouped by title, each title kept as a min-heap ordered by
+    (active_project_count, last_project_date). Hires, promotions and departures are
+    replayed from the title history as the simulation clock advances, and project joins
+    and leaves arrive from the state registry. Superseded heap entries are skipped when
+    they surface, so every update is a single push.
+    '''
+    def __init__(self, consultant_state, consultants, units, events):
+        self.consultant_state = consultant_state
+        self.consultants = consultants
+        self.units = units
+        self.events = events
+        self._next_event = 0
+        self.titles = {}
+        self.headcount = Counter()
+        self._unit_counts = defaultdict(Counter)
+        self._heaps = defaultdict(list)
+        self._versions = defaultdict(int)
+        consultant_state.subscribe(self.refresh)
+
+    @classmethod
+    def load(cls, session, consultant_state, current_date):
+        consultants = {c.ConsultantID: c for c in session.query(Consultant).all()}
+        units = {consultant_id: c.BusinessUnitID for consultant_id, c in consultants.items()}
+
+        # (date, consultant, title): a hire or promotion sets the title, a departure clears it
+        events = []
+        for record in session.query(ConsultantTitleHistory).order_by(
+                ConsultantTitleHistory.ConsultantID, ConsultantTitleHistory.StartDate, ConsultantTitleHistory.ID):
+            if record.EventType in ('Hire', 'Promotion'):
+                events.append((record.StartDate, record.ConsultantID, record.TitleID))
+            elif record.EventType in ('Attrition', 'Layoff'):
+                events.append((record.EndDate + timedelta(days=1), record.ConsultantID, None))
+        events.sort(key=lambda event: (event[0], event[1]))
+
+        tracker = cls(consultant_state, consultants, units, events)
+        tracker.advance(current_date)
+        return tracker
+
+    def advance(self, current_date):
+        '''Apply the hires, promotions and departures dated on or before current_date.'''
+        while self._next_event < len(self.events) and self.events[self._next_event][0] <= current_date:
+            _, consultant_id, title_id = self.events[self._next_event]
+            self._next_event += 1
+            if title_id is None:
+                self._leave(consultant_id)
+            else:
+                self._assign(consultant_id, title_id)
+
+    def _assign(self, consultant_id, title_id):
+        unit_id = self.units.get(consultant_id)
+        previous = self.titles.get(consultant_id)
+        if previous is not None:
+            self.headcount[previous] -= 1
+            self._unit_counts[previous][unit_id] -= 1
+        self.titles[consultant_id] = title_id
+        self.headcount[title_id] += 1
+        self._unit_counts[title_id][unit_id] += 1
+        self.refresh(consultant_id)
+
+    def _leave(self, consultant_id):
+        title_id = self.titles.pop(consultant_id, None)
+        if title_id is None:
+            return
+        self.headcount[title_id] -= 1
+        self._unit_counts[title_id][self.units.get(consultant_id)] -= 1
+        self._versions[consultant_id] += 1
+
+    def refresh(self, consultant_id):
+        title_id = self.titles.get(consultant_id)
+        if title_id is None or consultant_id not in self.consultant_state:
+            return
+        if self.consultant_state.title_id(consultant_id) != title_id:
+            # The registry calls back once the title is updated
+            self.consultant_state.update(consultant_id, title_id=title_id)
+            return
+
+        state = self.consultant_state[consultant_id]
+        self._versions[consultant_id] += 1
+        heap = self._heaps[title_id]
+        heapq.heappush(heap, (state.active_project_count, state.last_project_date or date.min,
+                              consultant_id, self._versions[consultant_id]))
+        if len(heap) > 4 * self.headcount[title_id] + 64:
+            self._heaps[title_id] = [entry for entry in heap if self._is_current(title_id, entry)]
+            heapq.heapify(self._heaps[title_id])
+
+    def _is_current(self, title_id, entry):
+        consultant_id, version = entry[2], entry[3]
+        return self.titles.get(consultant_id) == title_id and self._versions[consultant_id] == version
+
+    def pick(self, title_id, count, exclude=(), max_projects=None):
+        '''
+        Up to count consultants with title_id, least busy first, skipping exclude and,
+        with max_projects, anyone already at that many projects. Picking changes nothing.
+        '''
+        heap = self._heaps[title_id]
+        picked = []
+        seen = []
+        while heap and len(picked) < count:
+            entry = heapq.heappop(heap)
+            if not self._is_current(title_id, entry):
+                continue
+            seen.append(entry)
+            if max_projects is not None and entry[0] >= max_projects:
+                break
+            if entry[2] not in exclude:
+                picked.append(self.consultants[entry[2]])
+        for entry in seen:
+            heapq.heappush(heap, entry)
+        return picked
+
+    def free_capacity(self, title_ids, max_projects_per_title, default=2):
+        return sum(max(0, max_projects_per_title.get(title_id, default) - self.consultant_state.active_project_count(consultant_id))
+                   for consultant_id, title_id in self.titles.items() if title_id in title_ids)
+
+    def unit_counts(self, max_title_id):
+        '''Employed consultants per business unit, over titles up to max_title_id.'''
+        counts = Counter()
+        for title_id, unit_counts in self._unit_counts.items():
+            if title_id <= max_title_id:
+                counts.update(unit_counts)
+        return +counts
@@ -0,0 +1,40 @@
+import heapq
+from itertools import count
+
+# Event kinds, listed in the order they are processed when they share a date
+YEAR_START = 'year_start'
+MONTH_START = 'month_start'
+PROJECT_START = 'project_start'
+WORKDAY = 'workday'
+DELIVERABLE_DUE = 'deliverable_due'
+PROJECT_TIMEOUT = 'project_timeout'
+MONTH_END = 'month_end'
+
+EVENT_PRIORITY = {
+    YEAR_START: 0,
+    MONTH_START: 1,
+    PROJECT_START: 2,
+    WORKDAY: 3,
+    DELIVERABLE_DUE: 4,
+    PROJECT_TIMEOUT: 5,
+    MONTH_END: 6
+}
+
+
+class EventScheduler:
+    '''
+    Priority queue of simulation events ordered by (date, priority, insertion order).
+    '''
+    def __init__(self):
+        self._queue = []
+        self._sequence = count()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def schedule(self, when, kind, payload=None):
+        heapq.heappush(self._queue, (when, EVENT_PRIORITY[kind], next(self._sequence), kind, payload))
+
+    def pop(self):
+        when, _, _, kind, payload = heapq.heappop(self._queue)
+        return when, kind, payload
@@ -0,0 +1,154 @@
+'''
+Run instrumentation: phase timers, per-function call counters and SQL statement
+counts/time, with optional cProfile and tracemalloc capture per phase.
+One module-level Instrumentation object collects everything for the process.
+'''
+import os
+import io
+import json
+import time
+import pstats
+import logging
+import cProfile
+import tracemalloc
+from functools import wraps
+from contextlib import contextmanager
+from collections import defaultdict
+from sqlalchemy import event
+from config import generation_settings
+
+def log_enabled(level=logging.INFO):
+    '''Cheap guard for log lines in hot loops, so their messages are only built when emitted.'''
+    return logging.root.isEnabledFor(level)
+
+
+class Instrumentation:
+    def __init__(self, profile_phases=(), trace_memory=False):
+        self.profile_phases = set(profile_phases)
+        self.trace_memory = trace_memory
+        self.phases = []
+        self.calls = defaultdict(lambda: [0, 0.0])  # name -> [count, seconds]
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.sql_rows = 0
+        self._engines = set()
+
+    def attach_engine(self, engine):
+        '''Count every statement executed through engine (executemany counts once).'''
+        if id(engine) in self._engines:
+            return
+        self._engines.add(id(engine))
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            self.sql_seconds += time.perf_counter() - conn.info['query_start'].pop()
+            self.sql_count += 1
+            self.sql_rows += len(parameters) if executemany else 1
+
+    def counted(self, func):
+        '''Decorator: count calls to func and their cumulative wall time.'''
+        if not generation_settings.COUNT_CALLS:
+            return func
+        name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats = self.calls[name]
+                stats[0] += 1
+                stats[1] += time.perf_counter() - start
+        return wrapper
+
+    @contextmanager
+    def phase(self, name):
+        profile = cProfile.Profile() if name in self.profile_phases or 'all' in self.profile_phases else None
+        trace = self.trace_memory and not tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.start()
+        sql_count, sql_seconds, sql_rows = self.sql_count, self.sql_seconds, self.sql_rows
+        calls_before = {key: list(value) for key, value in self.calls.items()}
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            record = {
+                'phase': name,
+                'seconds': round(time.perf_counter() - start, 3),
+                'sql_statements': self.sql_count - sql_count,
+                'sql_seconds': round(self.sql_seconds - sql_seconds, 3),
+                'sql_rows': self.sql_rows - sql_rows,
+                'calls': {
+                    key: {'count': count - calls_before.get(key, [0, 0.0])[0],
+                          'seconds': round(seconds - calls_before.get(key, [0, 0.0])[1], 3)}
+                    for key, (count, seconds) in self.calls.items()
+                    if count != calls_before.get(key, [0, 0.0])[0]
+                }
+            }
+            if trace:
+                record['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+                tracemalloc.stop()
+            if profile:
+                record['profile'] = profile
+            self.phases.append(record)
+
+    def summary(self):
+        lines = [f"{'phase':<20} {'seconds':>9} {'sql stmts':>10} {'sql s':>8} {'peak MB':>8}"]
+        for record in self.phases:
+            lines.append(f"{record['phase']:<20} {record['seconds']:>9.2f} {record['sql_statements']:>10} "
+                         f"{record['sql_seconds']:>8.2f} {record.get('peak_traced_mb', ''):>8}")
+        if self.calls:
+            lines.append("")
+            lines.append(f"{'function':<60} {'calls':>9} {'seconds':>9}")
+            for name, (count, seconds) in sorted(self.calls.items(), key=lambda item: -item[1][1]):
+                lines.append(f"{name:<60} {count:>9} {seconds:>9.2f}")
+        return '\n'.join(lines)
+
+    def write_report(self, directory):
+        '''Print the summary and write summary.json plus one .prof/.txt per profiled phase.'''
+        os.makedirs(directory, exist_ok=True)
+        phases = []
+        for record in self.phases:
+            record = dict(record)
+            profile = record.pop('profile', None)
+            if profile:
+                profile_path = os.path.join(directory, f"{record['phase']}.prof")
+                profile.dump_stats(profile_path)
+                text = io.StringIO()
+                pstats.Stats(profile, stream=text).sort_stats('cumulative').print_stats(40)
+                with open(os.path.join(directory, f"{record['phase']}_profile.txt"), 'w') as f:
+                    f.write(text.getvalue())
+                record['profile'] = profile_path
+            phases.append(record)
+
+        summary_path = os.path.join(directory, 'summary.json')
+        with open(summary_path, 'w') as f:
+            json.dump({
+                'phases': phases,
+                'total_seconds': round(sum(record['seconds'] for record in phases), 3),
+                'sql_statements': self.sql_count,
+                'sql_seconds': round(self.sql_seconds, 3),
+                'calls': {name: {'count': count, 'seconds': round(seconds, 3)}
+                          for name, (count, seconds) in self.calls.items()}
+            }, f, indent=2)
+
+        print(self.summary())
+        print(f"Instrumentation report saved to {summary_path}")
+        return summary_path
+
+
+instrumentation = Instrumentation(
+    profile_phases=generation_settings.PROFILE_PHASES,
+    trace_memory=generation_settings.TRACE_MEMORY
+)
+counted = instrumentation.counted
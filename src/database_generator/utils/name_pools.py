@@ -0,0 +1,74 @@
+'''
+Pre-generated name and contact pools per Faker locale. A pool is built once with a
+fixed seed, with non-Latin names already transliterated, and cached as JSON in
+cache_path, so later runs only read it back. Generators pick entries from the pools
+with their own random streams.
+'''
+import os
+import re
+import json
+import zlib
+import unicodedata
+import faker
+from faker import Faker
+from unidecode import unidecode
+from config.path_config import cache_path
+from config import generation_settings
+
+# Faker provider methods sampled into each kind of pool
+POOL_FIELDS = {
+    'person': ('first_name', 'last_name', 'phone_number'),
+    'company': ('word', 'company_suffix', 'phone_number', 'email')
+}
+TRANSLITERATED_FIELDS = {'first_name', 'last_name'}
+
+_pools = {}
+
+def is_latin(text):
+    # Remove diacritical marks
+    text = ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn')
+    return bool(re.match(r'^[a-zA-Z\s]+$', text))
+
+
+class NamePool:
+    def __init__(self, values):
+        self.values = values
+
+    def pick(self, field, rng):
+        values = self.values[field]
+        return values[rng.randrange(len(values))]
+
+
+def build_pool(locale, kind, size):
+    fake = Faker(locale)
+    fake.seed_instance(zlib.crc32(f'{kind}:{locale}'.encode()))
+    values = {}
+    for field in POOL_FIELDS[kind]:
+        generate = getattr(fake, field)
+        entries = [generate() for _ in range(size)]
+        if field in TRANSLITERATED_FIELDS:
+            entries = [entry if is_latin(entry) else unidecode(entry) for entry in entries]
+        values[field] = entries
+    return values
+
+def get_pool(locale, kind='person', size=generation_settings.NAME_POOL_SIZE):
+    '''Pool for locale, from memory, then the on-disk cache, then built and cached.'''
+    key = (locale, kind, size)
+    if key in _pools:
+        return _pools[key]
+
+    path = os.path.join(cache_path, f'{kind}_pool_{locale}_{size}_faker{faker.VERSION}.json')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            values = json.load(f)
+    else:
+        values = build_pool(locale, kind, size)
+        os.makedirs(cache_path, exist_ok=True)
+        # Write then rename, so a concurrent or interrupted run never reads half a file
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(values, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    _pools[key] = NamePool(values)
+    return _pools[key]
@@ -1,11 +1,15 @@
-import random
 import logging
 from decimal import Decimal, ROUND_HALF_UP
-from datetime import timedelta
-from sqlalchemy import func, cast, Integer
-from sqlalchemy.orm import aliased
+from datetime import date, timedelta
+from collections import defaultdict
+from sqlalchemy import func, event
 from models.db_model import *
 from config import project_settings
+from .random_streams import python_stream
+from .instrumentation import counted, log_enabled
+
+rng = python_stream('projects')
+expense_rng = python_stream('expenses')
 
 def round_to_nearest_thousand(value):
     return Decimal(value).quantize(Decimal('1000'), rounding=ROUND_HALF_UP)
@@ -18,28 +22,21 @@ def calculate_hourly_cost(session, consultant_id, year):
     hourly_cost = (avg_salary / 12) / (52 * 40)  # Assuming 52 weeks and 40 hours per week
     return hourly_cost * (1 + project_settings.OVERHEAD_PERCENTAGE)
 
-def calculate_average_experience(session, title_id, current_date):
-    ConsultantCustomDataAlias = aliased(ConsultantCustomData)
-    
-    consultants = session.query(Consultant).join(
-        ConsultantCustomDataAlias,
-        Consultant.ConsultantID == ConsultantCustomDataAlias.ConsultantID
-    ).filter(
-        cast(func.json_extract(ConsultantCustomDataAlias.CustomData, '$.title_id'), Integer) == title_id
-    ).all()
+def calculate_average_experience(consultant_state, title_id, current_date):
+    consultants = consultant_state.consultants_with_title(title_id)
     
     if not consultants:
         return 5  # Default to 5 years if no consultants found for this title
     
-    total_experience = sum((current_date.year - c.HireYear) for c in consultants)
+    total_experience = sum((current_date.year - c.hire_year) for c in consultants)
     return total_experience / len(consultants)
 
-def calculate_project_financials(session, project, assigned_consultants, current_date, deliverables):
+@counted
+def calculate_project_financials(session, project, assigned_consultants, current_date, deliverables, consultant_state):
     # Calculate billing rates for each title
     title_billing_rates = {}
     for consultant in assigned_consultants:
-        consultant_custom_data = session.query(ConsultantCustomData).get(consultant.ConsultantID)
-        title_id = consultant_custom_data.CustomData.get('title_id', 1)
+        title_id = consultant_state.title_id(consultant.ConsultantID)
         if title_id not in title_billing_rates:
             title_billing_rates[title_id] = calculate_billing_rate(
                 title_id, 
@@ -53,8 +50,7 @@ def calculate_project_financials(session, project, assigned_consultants, current
     for consultant in assigned_consultants:
         consultant_hours = Decimal(project.PlannedHours) / Decimal(len(assigned_consultants))
         cost_rate = Decimal(str(calculate_hourly_cost(session, consultant.ConsultantID, current_date.year)))
-        consultant_custom_data = session.query(ConsultantCustomData).get(consultant.ConsultantID)
-        billing_rate = title_billing_rates[consultant_custom_data.CustomData.get('title_id', 1)]
+        billing_rate = title_billing_rates[consultant_state.title_id(consultant.ConsultantID)]
         
         estimated_total_cost += cost_rate * consultant_hours
         estimated_total_revenue += billing_rate * consultant_hours
@@ -97,7 +93,8 @@ def calculate_project_financials(session, project, assigned_consultants, current
             deliverable.Price = float((Decimal(project.Price) * (Decimal(deliverable.PlannedHours) / total_planned_hours)).quantize(Decimal('0.01')))
 
     session.flush()
-    logging.info(f"Calculated financials for project {project.ProjectID}. Estimated total cost: {estimated_total_cost}, Estimated total revenue: {estimated_total_revenue}, Predefined expenses: {len(predefined_expenses)}")
+    if log_enabled():
+        logging.info(f"Calculated financials for project {project.ProjectID}. Estimated total cost: {estimated_total_cost}, Estimated total revenue: {estimated_total_revenue}, Predefined expenses: {len(predefined_expenses)}")
 
     return estimated_total_cost, estimated_total_revenue, predefined_expenses
 
@@ -114,7 +111,7 @@ def calculate_billing_rate(title_id, project_type, years_experience):
         rate *= Decimal('0.9')  # Slight discount for fixed-price projects
     
     # Add some randomness
-    rate *= Decimal(random.uniform(0.95, 1.05))
+    rate *= Decimal(rng.uniform(0.95, 1.05))
     
     return rate.quantize(Decimal('0.01'))
          
@@ -137,12 +134,12 @@ def generate_predefined_expenses(project, estimated_total_cost, deliverables):
             category_total = Decimal(str(max(min_range, min(float(target_total), max_range))))
             
             # Determine the number of expense entries for this category
-            num_entries = random.randint(1, 5)  # Generate between 1 to 5 entries per category
+            num_entries = expense_rng.randint(1, 5)  # Generate between 1 to 5 entries per category
             
             remaining_total = category_total
             for i in range(num_entries):
                 # Generate a random date within the project timeline
-                days_offset = random.randint(0, project_duration)
+                days_offset = expense_rng.randint(0, project_duration)
                 expense_date = project.PlannedStartDate + timedelta(days=days_offset)
                 
                 # Ensure the expense date doesn't exceed the project's actual end date
@@ -153,7 +150,7 @@ def generate_predefined_expenses(project, estimated_total_cost, deliverables):
                 if i == num_entries - 1:  # Last entry
                     amount = remaining_total
                 else:
-                    amount = remaining_total * Decimal(str(random.uniform(0.1, 0.5)))
+                    amount = remaining_total * Decimal(str(expense_rng.uniform(0.1, 0.5)))
                 amount = amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
                 remaining_total -= amount
                 
@@ -168,38 +165,80 @@ def generate_predefined_expenses(project, estimated_total_cost, deliverables):
                     }
                     expenses.append(expense)
 
-    logging.info(f"Generated {len(expenses)} predefined expenses for project {project.ProjectID}")
+    if log_enabled():
+        logging.info(f"Generated {len(expenses)} predefined expenses for project {project.ProjectID}")
     return expenses
 
-def generate_expense_records(session, project, current_date):
-    project_custom_data = session.query(ProjectCustomData).filter_by(ProjectID=project.ProjectID).first()
-    if not project_custom_data:
-        logging.warning(f"No custom data found for project {project.ProjectID}")
-        return
-
-    predefined_expenses = project_custom_data.CustomData.get('predefined_expenses', [])
-    if not predefined_expenses:
-        logging.warning(f"No predefined expenses found for project {project.ProjectID}")
-        return
-
-    # Filter expenses for the current date
-    current_expenses = [
-        e for e in predefined_expenses 
-        if datetime.strptime(e['Date'], '%Y-%m-%d').date() == current_date
-    ]
-
-    for expense in current_expenses:
-        expense_record = ProjectExpense(
-            ProjectID=project.ProjectID,
-            DeliverableID=expense['DeliverableID'],
-            Date=current_date,
-            Amount=float(expense['Amount']),
-            Description=expense['Description'],
-            Category=expense['Category'],
-            IsBillable=expense['IsBillable']
-        )
-        session.add(expense_record)
-        logging.info(f"Generated expense record for project {project.ProjectID}, deliverable {expense['DeliverableID']}: Amount={expense_record.Amount}, Category={expense_record.Category}")
-
-    session.flush()
-    logging.info(f"Generated {len(current_expenses)} expense records for project {project.ProjectID} on {current_date}")
+class ExpenseCalendar:
+    '''
+    Predefined project expenses bucketed by the (year, month) of their date. A project's
+    expenses are read from its custom data once, at its first month end, and each bucket
+    is dropped once its month end has been materialized. Only expenses dated exactly
+    on the month end are materialized, as before. Rolling back the transaction
+    clears the calendar so it is read again from the database.
+    '''
+    def __init__(self):
+        self.months = defaultdict(lambda: defaultdict(list))
+        self.indexed = set()
+
+    def bind(self, session):
+        event.listen(session, 'after_rollback', self.reset)
+        return self
+
+    def index(self, session, project_id, current_date):
+        if project_id in self.indexed:
+            return
+        self.indexed.add(project_id)
+        project_custom_data = session.get(ProjectCustomData, project_id)
+        if not project_custom_data:
+            logging.warning(f"No custom data found for project {project_id}")
+            return
+
+        current_month = (current_date.year, current_date.month)
+        for expense in project_custom_data.CustomData.get('predefined_expenses', []):
+            expense_date = date.fromisoformat(expense['Date'])
+            # Months already closed can no longer be materialized
+            if (expense_date.year, expense_date.month) >= current_month:
+                self.months[(expense_date.year, expense_date.month)][project_id].append((expense_date, expense))
+
+    def due(self, session, project_id, current_date):
+        self.index(session, project_id, current_date)
+        month = self.months.get((current_date.year, current_date.month))
+        if month is None:
+            return []
+        return [expense for expense_date, expense in month.get(project_id, []) if expense_date == current_date]
+
+    def close_month(self, current_date):
+        current_month = (current_date.year, current_date.month)
+        for month in [month for month in self.months if month <= current_month]:
+            del self.months[month]
+
+    def reset(self, session=None):
+        if session is not None and session.in_nested_transaction():
+            return
+        self.months.clear()
+        self.indexed.clear()
+
+@counted
+def generate_expense_records(session, projects, current_date, expense_calendar):
+    '''Materialize the predefined expenses dated current_date for projects, in one bulk insert.'''
+    expense_records = []
+    for project in projects:
+        for expense in expense_calendar.due(session, project.ProjectID, current_date):
+            expense_records.append({
+                'ProjectID': project.ProjectID,
+                'DeliverableID': expense['DeliverableID'],
+                'Date': current_date,
+                'Amount': float(expense['Amount']),
+                'Description': expense['Description'],
+                'Category': expense['Category'],
+                'IsBillable': expense['IsBillable']
+            })
+            if log_enabled():
+                logging.info(f"Generated expense record for project {project.ProjectID}, deliverable {expense['DeliverableID']}: Amount={expense['Amount']}, Category={expense['Category']}")
+    expense_calendar.close_month(current_date)
+
+    if expense_records:
+        session.bulk_insert_mappings(ProjectExpense, expense_records)
+    if log_enabled():
+        logging.info(f"Generated {len(expense_records)} expense records for {len(projects)} projects on {current_date}")
@@ -1,13 +1,17 @@
 from decimal import Decimal, ROUND_HALF_UP
 from dataclasses import dataclass
-import random
 from datetime import timedelta, date
-from sqlalchemy import func, case
+from sqlalchemy import func
+from sqlalchemy.orm.attributes import flag_modified
 from collections import Counter
 from models.db_model import *
 from config import project_settings
 import math
 import logging
+from .random_streams import python_stream
+from .instrumentation import counted, log_enabled
+
+rng = python_stream('projects')
 
 def serialize_dates(data):
     if isinstance(data, dict):
@@ -29,14 +33,15 @@ def calculate_planned_hours(project, team_size):
     return round(total_planned_hours)
 
 def calculate_target_hours(planned_hours):
-    if random.random() < 0.05:  # 10% chance of finishing early
-        factor = random.uniform(0.9, 0.95)
+    if rng.random() < 0.05:  # 10% chance of finishing early
+        factor = rng.uniform(0.9, 0.95)
     else:  # 95% chance of overrunning
-        factor = random.uniform(1.05, 1.1)
+        factor = rng.uniform(1.05, 1.1)
     return round(planned_hours * factor)
 
 
-def assign_project_team(session, project, assigned_consultants):
+@counted
+def assign_project_team(session, project, assigned_consultants, consultant_state):
     '''
     takes the already selected consultants and 
     assigns roles to them in the ProjectTeam table
@@ -52,15 +57,13 @@ def assign_project_team(session, project, assigned_consultants):
         EndDate=None
     )
     session.add(team_member)
-    pm_custom_data = session.query(ConsultantCustomData).get(project_manager.ConsultantID)
     # Sort remaining consultants by title_id in descending order
-    team_members = sorted(assigned_consultants[1:], key=lambda c: session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('title_id', 1), reverse=True)
+    team_members = sorted(assigned_consultants[1:], key=lambda c: consultant_state.title_id(c.ConsultantID), reverse=True)
 
     # Assign Team Leads (up to 3 consultants with title_id >= 3)
     team_leads_count = 0
     for consultant in team_members:
-        consultant_custom_data = session.query(ConsultantCustomData).get(consultant.ConsultantID)
-        if consultant_custom_data.CustomData.get('title_id', 1) >= 3 and team_leads_count < 3:
+        if consultant_state.title_id(consultant.ConsultantID) >= 3 and team_leads_count < 3:
             role = 'Team Lead'
             team_leads_count += 1
         else:
@@ -88,62 +91,7 @@ def calculate_project_progress(project, deliverables):
 
 
 
-def get_available_consultants(session, current_date):
-    two_months_ago = current_date - timedelta(days=60)
-    
-    # Subquery to get the most recent title for each consultant
-    latest_title = session.query(
-        ConsultantTitleHistory.ConsultantID,
-        func.max(ConsultantTitleHistory.StartDate).label('latest_start_date')
-    ).filter(
-        ConsultantTitleHistory.StartDate <= current_date
-    ).group_by(ConsultantTitleHistory.ConsultantID).subquery()
-
-    results = session.query(
-        Consultant,
-        ConsultantTitleHistory.TitleID,
-        func.coalesce(func.max(ProjectTeam.EndDate), func.min(ConsultantTitleHistory.StartDate)).label('last_project_date'),
-        func.count(case((ProjectTeam.EndDate.is_(None) | (ProjectTeam.EndDate >= current_date), 1))).label('active_project_count')
-    ).join(
-        latest_title,
-        Consultant.ConsultantID == latest_title.c.ConsultantID
-    ).join(
-        ConsultantTitleHistory,
-        (Consultant.ConsultantID == ConsultantTitleHistory.ConsultantID) &
-        (ConsultantTitleHistory.StartDate == latest_title.c.latest_start_date)
-    ).outerjoin(
-        ProjectTeam,
-        (Consultant.ConsultantID == ProjectTeam.ConsultantID) &
-        (ProjectTeam.StartDate <= current_date) &
-        ((ProjectTeam.EndDate.is_(None)) | (ProjectTeam.EndDate >= two_months_ago))
-    ).group_by(
-        Consultant.ConsultantID,
-        ConsultantTitleHistory.TitleID
-    ).order_by(
-        'active_project_count',
-        'last_project_date'
-    ).all()
-
-    available_consultants = []
-    for consultant, title_id, last_project_date, active_project_count in results:
-        consultant_custom_data = session.query(ConsultantCustomData).get(consultant.ConsultantID)
-        if not consultant_custom_data:
-            consultant_custom_data = ConsultantCustomData(ConsultantID=consultant.ConsultantID, CustomData={})
-            session.add(consultant_custom_data)
-        
-        # Update consultant metadata
-        consultant_custom_data.CustomData.update({
-            'title_id': title_id,
-            'last_project_date': last_project_date.isoformat() if last_project_date else None,
-            'active_project_count': int(active_project_count) if active_project_count is not None else 0
-        })
-        available_consultants.append(consultant)
-
-    return available_consultants
-
-
-def assign_project_to_business_unit(session, assigned_consultants, active_units, current_year):
-    consultant_unit_counts = Counter(consultant.BusinessUnitID for consultant in assigned_consultants)
+def assign_project_to_business_unit(session, consultant_unit_counts, active_units, current_year):
     project_counts = dict(session.query(
         Project.UnitID, func.count(Project.ProjectID)
     ).filter(
@@ -167,23 +115,15 @@ def assign_project_to_business_unit(session, assigned_consultants, active_units,
                                for unit_id in project_counts.keys()}
     return max(distribution_difference, key=distribution_difference.get)
 
-def assign_consultants_to_project(session, available_consultants, project_manager, target_team_size):
+@counted
+def assign_consultants_to_project(consultant_state, availability, project_manager, target_team_size):
     '''
     main function to select which consultants will be on the project team.
+    Members are drawn from titles 1 up to the project manager's title, least busy
+    first, so nobody on the team outranks its manager.
     '''
     assigned_consultants = [project_manager]
-    
-    # Separate consultants by title
-    consultants_by_title = {title: [] for title in range(1, 7)}
-    for c in available_consultants:
-        if c != project_manager:
-            consultant_custom_data = session.query(ConsultantCustomData).get(c.ConsultantID)
-            title = consultant_custom_data.CustomData.get('title_id', 1)
-            consultants_by_title[title].append(c)
-
-    # Sort consultants in each title group
-    for title in consultants_by_title:
-        consultants_by_title[title].sort(key=lambda c: session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('active_project_count', 0))
+    pm_title_id = consultant_state.title_id(project_manager.ConsultantID)
 
     remaining_slots = max(0, target_team_size - 1)  # Subtract 1 for the project manager
 
@@ -199,15 +139,11 @@ def assign_consultants_to_project(session, available_consultants, project_manage
         else:
             break
 
-    # Assign consultants based on target counts
-    for title in range(1, 7):
-        for _ in range(target_counts[title]):
-            if consultants_by_title[title]:
-                consultant = consultants_by_title[title].pop(0)
-                assigned_consultants.append(consultant)
-                remaining_slots -= 1
-            else:
-                break
+    # Titles above the project manager's are never staffed, as with the old eligible_consultants filter
+    for title in range(1, pm_title_id + 1):
+        consultants = availability.pick(title, target_counts[title], exclude={project_manager.ConsultantID})
+        assigned_consultants.extend(consultants)
+        remaining_slots -= len(consultants)
     return assigned_consultants, remaining_slots
 
 def set_project_dates(project, current_date, project_manager, session, simulation_start_date):
@@ -215,16 +151,16 @@ def set_project_dates(project, current_date, project_manager, session, simulatio
     duration_ranges = project_settings.PROJECT_DURATION_RANGE
 
     # Select a duration range based on the given probabilities
-    selected_range, _ = random.choices(duration_ranges, weights=[p for _, p in duration_ranges])[0]
+    selected_range, _ = rng.choices(duration_ranges, weights=[p for _, p in duration_ranges])[0]
 
     # Select a specific duration within the chosen range
-    duration_months = random.randint(*selected_range)
+    duration_months = rng.randint(*selected_range)
 
     pm_availability = max(get_consultant_availability(session, project_manager.ConsultantID, current_date), simulation_start_date)
 
     # Maintain variance between PlannedStartDate and ActualStartDate
-    project.PlannedStartDate = pm_availability + timedelta(days=random.randint(0, 14))
-    actual_start_variance = timedelta(days=random.randint(0, 7))
+    project.PlannedStartDate = pm_availability + timedelta(days=rng.randint(0, 14))
+    actual_start_variance = timedelta(days=rng.randint(0, 7))
     project.ActualStartDate = project.PlannedStartDate + actual_start_variance
 
     # Set initial status
@@ -240,11 +176,11 @@ def set_project_dates(project, current_date, project_manager, session, simulatio
             days_added += 1
     
     if duration_months <= 3:
-        target_team_size = random.randint(5, 7)  # Small project
+        target_team_size = rng.randint(5, 7)  # Small project
     elif duration_months <= 6:
-        target_team_size = random.randint(10, 12)  # Medium project
+        target_team_size = rng.randint(10, 12)  # Medium project
     else:
-        target_team_size = random.randint(12, 15)  # Large project
+        target_team_size = rng.randint(12, 15)  # Large project
 
     return target_team_size
 
@@ -257,7 +193,7 @@ def get_consultant_availability(session, consultant_id, current_date):
     return max(current_date, latest_project + timedelta(days=1)) if latest_project else current_date
 
 def generate_deliverables(project, target_hours):
-    num_deliverables = random.randint(*project_settings.DELIVERABLE_COUNT_RANGE)
+    num_deliverables = rng.randint(*project_settings.DELIVERABLE_COUNT_RANGE)
     deliverables = []
     remaining_target_hours = Decimal(str(target_hours))
     project_duration = (project.PlannedEndDate - project.PlannedStartDate).days
@@ -270,7 +206,7 @@ def generate_deliverables(project, target_hours):
         else:
             min_hours = Decimal('10')
             max_hours = max(min_hours, (remaining_target_hours - (num_deliverables - i - 1) * min_hours))
-            deliverable_target_hours = Decimal(str(random.uniform(float(min_hours), float(max_hours))))
+            deliverable_target_hours = Decimal(str(rng.uniform(float(min_hours), float(max_hours))))
             remaining_target_hours -= deliverable_target_hours
 
         start_date = project.PlannedStartDate if i == 0 else deliverables[-1].DueDate + timedelta(days=1)
@@ -297,7 +233,15 @@ def generate_deliverables(project, target_hours):
 def round_decimal(value, decimal_places=1):
     return value.quantize(Decimal(10) ** -decimal_places, rounding=ROUND_HALF_UP)
 
-def update_project_team(session, project, available_consultants, current_team, current_date):
+def to_tenths(hours):
+    '''Non-negative hours as an integer count of tenths, rounded half up like round_decimal.'''
+    return int(hours * 10 + 0.5)
+
+def from_tenths(tenths):
+    return tenths / 10
+
+@counted
+def update_project_team(session, project, availability, current_team, current_date, consultant_state):
     project_custom_data = session.query(ProjectCustomData).get(project.ProjectID)
     if not project_custom_data:
         project_custom_data = ProjectCustomData(ProjectID=project.ProjectID, CustomData={})
@@ -311,7 +255,7 @@ def update_project_team(session, project, available_consultants, current_team, c
 
     if remaining_slots > 0:
         # Calculate current team composition
-        current_composition = Counter(session.query(ConsultantCustomData).get(c).CustomData.get('title_id', 1) for c in current_team)
+        current_composition = Counter(consultant_state.title_id(c) for c in current_team)
         
         # Calculate target counts for remaining slots
         target_counts = {title: max(1, round(remaining_slots * project_settings.TITLE_DISTRIBUTION_TARGETS[title])) 
@@ -321,22 +265,13 @@ def update_project_team(session, project, available_consultants, current_team, c
         for title in range(1, 7):
             target_counts[title] = max(0, target_counts[title] - current_composition[title])
 
-        # Sort available consultants
-        available_consultants.sort(key=lambda c: (
-            session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('active_project_count', 0),
-            -session.query(ConsultantCustomData).get(c.ConsultantID).CustomData.get('title_id', 1)
-        ))
-
-        for consultant in available_consultants:
+        # Least busy consultants with spare capacity, senior titles first
+        for title in range(6, 0, -1):
             if remaining_slots <= 0:
                 break
-
-            consultant_custom_data = session.query(ConsultantCustomData).get(consultant.ConsultantID)
-            consultant_title = consultant_custom_data.CustomData.get('title_id', 1)
-            if (consultant.ConsultantID not in current_team and 
-                target_counts[consultant_title] > 0 and
-                consultant_custom_data.CustomData.get('active_project_count', 0) < project_settings.MAX_PROJECTS_PER_CONSULTANT.get(consultant_title, 2)):
-
+            max_projects = project_settings.MAX_PROJECTS_PER_CONSULTANT.get(title, 2)
+            for consultant in availability.pick(title, min(target_counts[title], remaining_slots),
+                                                exclude=set(current_team), max_projects=max_projects):
                 team_member = ProjectTeam(
                     ProjectID=project.ProjectID,
                     ConsultantID=consultant.ConsultantID,
@@ -345,12 +280,15 @@ def update_project_team(session, project, available_consultants, current_team, c
                 )
                 session.add(team_member)
                 current_team.append(consultant.ConsultantID)
-                consultant_custom_data.CustomData['active_project_count'] = consultant_custom_data.CustomData.get('active_project_count', 0) + 1
-                target_counts[consultant_title] -= 1
+                consultant_state.update(consultant.ConsultantID, active_project_count=consultant_state.active_project_count(consultant.ConsultantID) + 1)
+                target_counts[title] -= 1
                 remaining_slots -= 1
-                logging.info(f"Added consultant {consultant.ConsultantID} (Title: {consultant_title}) to project {project.ProjectID} team")
+                if log_enabled():
+                    logging.info(f"Added consultant {consultant.ConsultantID} (Title: {title}) to project {project.ProjectID} team")
 
     # Update CustomData with recalculated values
     project_custom_data.CustomData['team'] = current_team
     project_custom_data.CustomData['remaining_slots'] = remaining_slots
     project_custom_data.CustomData['target_team_size'] = target_team_size
+    # Edited in place, which the JSON column does not notice by itself
+    flag_modified(project_custom_data, 'CustomData')
@@ -0,0 +1,103 @@
+from sqlalchemy import event
+from models.db_model import Deliverable, ProjectCustomData
+from .project_utils import to_tenths, from_tenths
+
+
+class DeliverableState:
+    __slots__ = ('deliverable_id', 'planned_start_date', 'target_tenths', 'actual_tenths', 'status',
+                 'progress', 'actual_start_date', 'submission_date', 'invoiced_date')
+
+    def __init__(self, deliverable, target_hours):
+        self.deliverable_id = deliverable.DeliverableID
+        self.planned_start_date = deliverable.PlannedStartDate
+        self.target_tenths = to_tenths(target_hours)
+        self.actual_tenths = to_tenths(deliverable.ActualHours or 0)
+        self.status = deliverable.Status
+        self.progress = deliverable.Progress
+        self.actual_start_date = deliverable.ActualStartDate
+        self.submission_date = deliverable.SubmissionDate
+        self.invoiced_date = deliverable.InvoicedDate
+
+    def to_mapping(self):
+        return {
+            'DeliverableID': self.deliverable_id,
+            'ActualHours': from_tenths(self.actual_tenths),
+            'Status': self.status,
+            'Progress': self.progress,
+            'ActualStartDate': self.actual_start_date,
+            'SubmissionDate': self.submission_date,
+            'InvoicedDate': self.invoiced_date
+        }
+
+
+class ProjectState:
+    __slots__ = ('project_id', 'team', 'target_tenths', 'deliverables')
+
+    def __init__(self, project_id, team, target_hours, deliverables):
+        self.project_id = project_id
+        self.team = team
+        self.target_tenths = to_tenths(target_hours)
+        self.deliverables = deliverables
+
+
+class ProjectWorkingSet:
+    '''
+    Deliverables, team and target hours of the projects being worked on, read from
+    ProjectCustomData and Deliverable once when a project goes live. Deliverable progress
+    is updated in place and written back in one batch when the bound session commits.
+    Rolling back the transaction drops everything so it is read again from the database;
+    a rolled back savepoint never covers deliverable progress and leaves it alone.
+    '''
+    def __init__(self):
+        self.projects = {}
+        self._dirty = {}
+
+    def bind(self, session):
+        event.listen(session, 'before_commit', self.sync)
+        event.listen(session, 'after_rollback', self.reset)
+        return self
+
+    def get(self, session, project_id):
+        '''Working state for project_id, loaded on first use; None without custom data.'''
+        state = self.projects.get(project_id)
+        if state is None:
+            state = self.projects[project_id] = self._load(session, project_id)
+        return state
+
+    def _load(self, session, project_id):
+        project_custom_data = session.get(ProjectCustomData, project_id)
+        if not project_custom_data:
+            return None
+        custom_data = project_custom_data.CustomData
+        deliverables_meta = custom_data.get('deliverables', {})
+        rows = {d.DeliverableID: d for d in session.query(Deliverable).filter(Deliverable.ProjectID == project_id)}
+        # Keep the custom data order, the order deliverables are worked on
+        deliverables = [DeliverableState(rows[int(deliverable_id)], meta['target_hours'])
+                        for deliverable_id, meta in deliverables_meta.items()]
+        return ProjectState(project_id, list(custom_data.get('team', [])), custom_data.get('target_hours', 0), deliverables)
+
+    def set_team(self, project_id, team):
+        '''Follow staffing changes of a tracked project; untracked ones read the team on load.'''
+        state = self.projects.get(project_id)
+        if state is not None:
+            state.team = list(team)
+
+    def mark(self, deliverable):
+        self._dirty[deliverable.deliverable_id] = deliverable
+
+    def discard(self, project_id):
+        '''Stop tracking a finished project; its pending changes are still written on sync.'''
+        self.projects.pop(project_id, None)
+
+    def sync(self, session):
+        if not self._dirty:
+            return
+        session.bulk_update_mappings(Deliverable, [self._dirty[deliverable_id].to_mapping()
+                                                   for deliverable_id in sorted(self._dirty)])
+        self._dirty.clear()
+
+    def reset(self, session=None):
+        if session is not None and session.in_nested_transaction():
+            return
+        self.projects.clear()
+        self._dirty.clear()
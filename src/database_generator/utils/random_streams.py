@@ -0,0 +1,64 @@
+'''
+Named random streams for the generators. Every stream is derived from one root
+SeedSequence, so a whole run is reproducible from a single seed and no two generators
+(or worker processes) share random state. Streams are created once and reseeded in
+place by set_seed, so modules can hold them from import time.
+'''
+import random
+import zlib
+import numpy as np
+
+_root = np.random.SeedSequence()
+_python_streams = {}
+_numpy_streams = {}
+
+def _stream_seed(name):
+    return np.random.SeedSequence(_root.entropy, spawn_key=_root.spawn_key + (zlib.crc32(name.encode()),))
+
+def _integer_seed(name):
+    return int.from_bytes(_stream_seed(name).generate_state(4).tobytes(), 'little')
+
+def python_stream(name):
+    '''random.Random stream shared by every caller using the same name.'''
+    if name not in _python_streams:
+        _python_streams[name] = random.Random(_integer_seed(f'python:{name}'))
+    return _python_streams[name]
+
+def numpy_stream(name):
+    '''numpy Generator stream shared by every caller using the same name.'''
+    if name not in _numpy_streams:
+        _numpy_streams[name] = np.random.Generator(np.random.PCG64(_stream_seed(f'numpy:{name}')))
+    return _numpy_streams[name]
+
+def set_seed(seed=None, spawn_key=()):
+    '''
+    Reseed every stream from seed (None draws fresh OS entropy).
+    Returns the root entropy, which reproduces the run when passed back in.
+    '''
+    global _root
+    _root = np.random.SeedSequence(seed, spawn_key=tuple(spawn_key))
+    for name, stream in _python_streams.items():
+        stream.seed(_integer_seed(f'python:{name}'))
+    for name, stream in _numpy_streams.items():
+        stream.bit_generator.state = np.random.PCG64(_stream_seed(f'numpy:{name}')).state
+    return _root.entropy
+
+def worker_seed(name):
+    '''(seed, spawn_key) arguments for set_seed in a worker process with its own streams.'''
+    child = _stream_seed(f'worker:{name}')
+    return child.entropy, child.spawn_key
+
+def get_state():
+    '''JSON-serialisable snapshot of every python and numpy stream.'''
+    return {
+        'python': {name: [stream.getstate()[0], list(stream.getstate()[1]), stream.getstate()[2]]
+                   for name, stream in _python_streams.items()},
+        'numpy': {name: stream.bit_generator.state for name, stream in _numpy_streams.items()}
+    }
+
+def set_state(state):
+    '''Restore streams captured by get_state.'''
+    for name, (version, internal_state, gauss_next) in state.get('python', {}).items():
+        python_stream(name).setstate((version, tuple(internal_state), gauss_next))
+    for name, bit_generator_state in state.get('numpy', {}).items():
+        numpy_stream(name).bit_generator.state = bit_generator_state
@@ -0,0 +1,81 @@
+'''
+Warehouses the ETL can load into. Every target opens one connection per load worker
+and writes a DataFrame into a table, replacing it or appending to it. The local
+targets mirror the Snowflake table names so loads can be tuned offline.
+'''
+import sqlite3
+
+
+class SnowflakeTarget:
+    name = 'snowflake'
+
+    def __init__(self, **connection_args):
+        self.connection_args = connection_args
+
+    def connect(self):
+        from snowflake.connector import connect
+        return connect(**self.connection_args)
+
+    def write(self, connection, table_name, df, overwrite):
+        from snowflake.connector.pandas_tools import write_pandas
+        success, nchunks, nrows, _ = write_pandas(connection, df, table_name, overwrite=overwrite)
+        if not success:
+            raise RuntimeError(f"write_pandas reported a failed load into {table_name}")
+        return nrows
+
+    def close(self, connection):
+        connection.close()
+
+
+class SQLiteTarget:
+    '''
+    A second SQLite file as the warehouse. Concurrent table loads serialize on the
+    file lock, so this measures the pipeline around the load rather than the writes.
+    '''
+    name = 'sqlite'
+
+    def __init__(self, path, batch_size=10000):
+        self.path = path
+        self.batch_size = batch_size
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=300, check_same_thread=False)
+
+    def write(self, connection, table_name, df, overwrite):
+        df.to_sql(table_name, connection, if_exists='replace' if overwrite else 'append',
+                  index=False, chunksize=self.batch_size)
+        connection.commit()
+        return len(df)
+
+    def close(self, connection):
+        connection.close()
+
+
+class DuckDBTarget:
+    name = 'duckdb'
+
+    def __init__(self, path):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("duckdb is required for the duckdb ETL target (pip install duckdb)") from e
+        # One database handle; each worker gets its own cursor on it
+        self.database = duckdb.connect(path)
+
+    def connect(self):
+        return self.database.cursor()
+
+    def write(self, connection, table_name, df, overwrite):
+        connection.register('chunk', df)
+        try:
+            if overwrite:
+                connection.execute(f'CREATE OR REPLACE TABLE "{table_name}" AS SELECT * FROM chunk')
+            else:
+                connection.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" AS SELECT * FROM chunk LIMIT 0')
+                connection.execute(f'INSERT INTO "{table_name}" SELECT * FROM chunk')
+        finally:
+            connection.unregister('chunk')
+        return len(df)
+
+    def close(self, connection):
+        connection.close()
@@ -1,10 +1,20 @@
 import os
+import sys
+import json
+import importlib.util
+import time
+import shutil
 import sqlite3
+import threading
 import pandas as pd
-from snowflake.connector import connect
-from snowflake.connector.pandas_tools import write_pandas
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import logging
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import etl_settings
+from config.path_config import db_file_path, etl_state_file, etl_staging_path, etl_target_path, etl_load_report_file
+from etl_service.load_targets import SnowflakeTarget, SQLiteTarget, DuckDBTarget
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,7 +23,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 load_dotenv()
 
 # SQLite Configuration
-SQLITE_DB_PATH = r"C:\Users\putti\Documents\Projects\ConsultFirmDBMockup\example_output\database\consulting_firm.db"
+SQLITE_DB_PATH = db_file_path
 
 # Snowflake Configuration
 SNOWFLAKE_ACCOUNT = os.getenv('SNOWFLAKE_ACCOUNT')
@@ -23,8 +33,12 @@ SNOWFLAKE_WAREHOUSE = os.getenv('SNOWFLAKE_WAREHOUSE')
 SNOWFLAKE_DATABASE = 'consulting_firm_db'
 SNOWFLAKE_SCHEMA = 'public'
 
+STAGING_EXTENSIONS = {'parquet': 'parquet', 'csv': 'csv.gz'}
+# Column dtypes of a staged table, written next to its chunks
+STAGED_DTYPES_FILE = 'dtypes.json'
+
 # Helper tables to exclude
-EXCLUDED_TABLES = ['ConsultantCustomData', 'ProjectCustomData']
+EXCLUDED_TABLES = ['ConsultantCustomData', 'ProjectCustomData', 'SimulationCheckpoint']
 
 # Mapping of SQLite table names to Snowflake table names
 TABLE_NAME_MAPPING = {
@@ -131,66 +145,263 @@ COLUMN_NAME_MAPPING = {
 }
 
 
-def extract_from_sqlite():
-    """Extract data from SQLite database."""
-    conn = sqlite3.connect(SQLITE_DB_PATH)
-    cursor = conn.cursor()
+def load_watermarks(path=etl_state_file):
+    """Per-table high-watermarks of the last successful incremental load."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_watermarks(watermarks, path=etl_state_file):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(temp_path, path)
+
+def watermark_column(cursor, table):
+    """Configured watermark column, else the table's integer primary key."""
+    if table in etl_settings.WATERMARK_COLUMNS:
+        return etl_settings.WATERMARK_COLUMNS[table]
+    cursor.execute(f'PRAGMA table_info("{table}")')
+    primary_keys = [row[1] for row in cursor.fetchall() if row[5] and row[2].upper() == 'INTEGER']
+    return primary_keys[0] if len(primary_keys) == 1 else None
+
+def read_only_connection(path=None):
+    """Read-only SQLite connection, one per extraction worker."""
+    uri = Path(path or SQLITE_DB_PATH).resolve().as_uri() + '?mode=ro'
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
 
+def plan_extraction(cursor, watermarks=None):
+    """
+    One (table, query, params) per table to extract, plus the new watermarks and the
+    tables read in full. Without watermarks every table is read in full.
+    """
     # Get all table names
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
     tables = [table[0] for table in cursor.fetchall() if table[0] not in EXCLUDED_TABLES]
 
-    data = {}
+    queries = []
+    new_watermarks = {}
+    full_tables = set()
     for table in tables:
-        logging.info(f"Extracting data from table: {table}")
-        data[table] = pd.read_sql_query(f"SELECT * FROM {table}", conn)
-
-    conn.close()
-    return data
-
-def transform_data(data):
-    """Transform data by renaming columns to match Snowflake schema."""
-    logging.info("Transforming data (renaming columns)")
-    for table, df in data.items():
-        df.rename(columns=COLUMN_NAME_MAPPING, inplace=True)
-    return data
-
-def load_to_snowflake(data):
-    """Load data into Snowflake."""
-    conn = connect(
-        account=SNOWFLAKE_ACCOUNT,
-        user=SNOWFLAKE_USER,
-        password=SNOWFLAKE_PASSWORD,
-        warehouse=SNOWFLAKE_WAREHOUSE,
-        database=SNOWFLAKE_DATABASE,
-        schema=SNOWFLAKE_SCHEMA
-    )
-
-    cursor = conn.cursor()
-
-    for table, df in data.items():
-        snowflake_table_name = TABLE_NAME_MAPPING.get(table, table.upper())
+        column = watermark_column(cursor, table) if watermarks is not None else None
+        if column is None or table in etl_settings.FULL_REFRESH_TABLES:
+            queries.append((table, f"SELECT * FROM {table}", ()))
+            full_tables.add(table)
+            continue
+
+        current = cursor.execute(f'SELECT MAX("{column}") FROM {table}').fetchone()[0]
+        last = watermarks.get(table)
+        if last is not None and current is not None and current < last:
+            # The database was regenerated since the last run
+            logging.warning(f"{table}.{column} is below its watermark; reloading the table")
+            last = None
+        if last is None:
+            full_tables.add(table)
+            queries.append((table, f'SELECT * FROM {table} WHERE "{column}" <= ?', (current,)))
+        else:
+            queries.append((table, f'SELECT * FROM {table} WHERE "{column}" > ? AND "{column}" <= ?', (last, current)))
+        new_watermarks[table] = current if current is not None else last
+
+    return queries, new_watermarks, full_tables
+
+def staged_dtypes(cursor, table):
+    """
+    pandas dtypes for a table's columns (by Snowflake name) from the declared SQLite types.
+    Inferring them per chunk would type a chunk whose nullable column is all null as
+    float, and the target would then get different types from different chunks.
+    """
+    overrides = etl_settings.STAGED_DTYPE_OVERRIDES.get(table, {})
+    dtypes = {}
+    for _, name, declared_type, *_ in cursor.execute(f'PRAGMA table_info("{table}")').fetchall():
+        declared_type = (declared_type or '').upper()
+        if name in overrides:
+            dtype = overrides[name]
+        elif 'INT' in declared_type:
+            dtype = 'Int64'
+        elif 'BOOL' in declared_type:
+            dtype = 'boolean'
+        elif any(kind in declared_type for kind in ('REAL', 'FLOA', 'DOUB', 'NUMERIC', 'DECIMAL')):
+            dtype = 'Float64'
+        else:
+            # Text, and dates, which SQLAlchemy stores as ISO strings
+            dtype = 'string'
+        dtypes[COLUMN_NAME_MAPPING.get(name, name)] = dtype
+    return dtypes
+
+def write_staged_chunk(df, path, fmt):
+    if fmt == 'parquet':
+        if importlib.util.find_spec('pyarrow') is None:
+            raise ImportError("pyarrow is required for Parquet staging (pip install pyarrow, or set ETL_STAGING_FORMAT=csv)")
+        df.to_parquet(path, index=False, compression=etl_settings.ETL_STAGING_COMPRESSION)
+    else:
+        df.to_csv(path, index=False, compression='gzip')
+
+def read_staged_chunk(path, dtypes=None):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, compression='gzip', dtype=dtypes, keep_default_na=False, na_values=[''])
+
+def read_staged_dtypes(paths):
+    if not paths:
+        return None
+    dtypes_path = os.path.join(os.path.dirname(paths[0]), STAGED_DTYPES_FILE)
+    if not os.path.exists(dtypes_path):
+        return None
+    with open(dtypes_path) as f:
+        return json.load(f)
+
+def stage_table(table, query, params, staging_dir, chunk_size, fmt):
+    """Stream one table out of SQLite in chunks, renamed for Snowflake, one file per chunk."""
+    table_dir = os.path.join(staging_dir, table)
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.makedirs(table_dir)
+    extension = STAGING_EXTENSIONS[fmt]
+
+    conn = read_only_connection()
+    paths = []
+    rows = 0
+    try:
+        dtypes = staged_dtypes(conn.cursor(), table)
+        with open(os.path.join(table_dir, STAGED_DTYPES_FILE), 'w') as f:
+            json.dump(dtypes, f, indent=2)
+        for chunk in pd.read_sql_query(query, conn, params=params, chunksize=chunk_size):
+            path = os.path.join(table_dir, f"part-{len(paths):05d}.{extension}")
+            write_staged_chunk(chunk.rename(columns=COLUMN_NAME_MAPPING).astype(dtypes), path, fmt)
+            paths.append(path)
+            rows += len(chunk)
+    finally:
+        conn.close()
+    return table, paths, rows
+
+def stage_from_sqlite(watermarks=None, staging_dir=etl_staging_path, workers=etl_settings.ETL_WORKERS,
+                      chunk_size=etl_settings.ETL_CHUNK_SIZE, fmt=etl_settings.ETL_STAGING_FORMAT):
+    """
+    Extract and transform every table into staged chunk files, tables in parallel on their
+    own read-only connections, so memory depends on chunk_size rather than table size.
+    Returns {table: [chunk paths]}, the new watermarks and the tables read in full.
+    """
+    if fmt not in STAGING_EXTENSIONS:
+        raise ValueError(f"Unknown ETL_STAGING_FORMAT '{fmt}'. Expected one of: {', '.join(STAGING_EXTENSIONS)}")
+    conn = read_only_connection()
+    try:
+        queries, new_watermarks, full_tables = plan_extraction(conn.cursor(), watermarks)
+    finally:
+        conn.close()
+
+    manifest = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(stage_table, table, query, params, staging_dir, chunk_size, fmt)
+                   for table, query, params in queries]
+        for future in futures:
+            table, paths, rows = future.result()
+            manifest[table] = paths
+            logging.info(f"Staged {rows} rows from {table} in {len(paths)} file(s)")
+    return manifest, new_watermarks, full_tables
+
+def iter_frames(paths):
+    """A table's staged chunks as DataFrames, one at a time, with the dtypes they were staged with."""
+    dtypes = read_staged_dtypes(paths)
+    for path in paths:
+        yield read_staged_chunk(path, dtypes)
+
+def create_target(kind=etl_settings.ETL_TARGET, path=etl_target_path):
+    """Load target named by ETL_TARGET: 'snowflake', or a local 'sqlite'/'duckdb' file at path."""
+    if kind == 'snowflake':
+        return SnowflakeTarget(
+            account=SNOWFLAKE_ACCOUNT,
+            user=SNOWFLAKE_USER,
+            password=SNOWFLAKE_PASSWORD,
+            warehouse=SNOWFLAKE_WAREHOUSE,
+            database=SNOWFLAKE_DATABASE,
+            schema=SNOWFLAKE_SCHEMA
+        )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if kind == 'sqlite':
+        return SQLiteTarget(path)
+    if kind == 'duckdb':
+        return DuckDBTarget(path)
+    raise ValueError(f"Unknown ETL_TARGET '{kind}'. Expected one of: snowflake, sqlite, duckdb")
+
+def load_table(target, connection, table, paths, overwrite):
+    """Stream one table's chunks into the target; only the first chunk may replace the table."""
+    table_name = TABLE_NAME_MAPPING.get(table, table.upper())
+    logging.info(f"Loading data into table: {table_name}")
+    start = time.perf_counter()
+    total_rows = 0
+    for df in iter_frames(paths):
+        if df.empty and not overwrite:
+            continue
+        total_rows += target.write(connection, table_name, df, overwrite)
+        overwrite = False
+    return total_rows, time.perf_counter() - start
+
+def load_tables(data, target, overwrite_tables=(), workers=etl_settings.ETL_LOAD_WORKERS):
+    """
+    Load data into target, several tables at once on one connection per worker. data maps
+    tables to their staged chunk files. Returns {table: load stats}.
+    """
+    local = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+
+    def worker_connection():
+        if not hasattr(local, 'connection'):
+            local.connection = target.connect()
+            with connections_lock:
+                connections.append(local.connection)
+        return local.connection
+
+    def run(table, paths):
         try:
-            logging.info(f"Loading data into table: {snowflake_table_name}")
-            success, nchunks, nrows, _ = write_pandas(conn, df, snowflake_table_name)
-            logging.info(f"Loaded {nrows} rows into {snowflake_table_name}")
+            rows, seconds = load_table(target, worker_connection(), table, paths, table in overwrite_tables)
         except Exception as e:
-            logging.error(f"Error loading data into {snowflake_table_name}: {str(e)}")
+            logging.error(f"Error loading data into {TABLE_NAME_MAPPING.get(table, table.upper())}: {str(e)}")
+            return table, {'success': False, 'error': str(e)}
+        rows_per_sec = round(rows / seconds, 1) if seconds > 0 else None
+        logging.info(f"Loaded {rows} rows into {TABLE_NAME_MAPPING.get(table, table.upper())} in {seconds:.2f}s ({rows_per_sec} rows/s)")
+        return table, {'success': True, 'rows': rows, 'seconds': round(seconds, 3), 'rows_per_sec': rows_per_sec}
 
-    conn.close()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = dict(executor.map(lambda item: run(*item), data.items()))
+    finally:
+        for connection in connections:
+            target.close(connection)
+    return results
+
+def write_load_report(results, target, path=etl_load_report_file):
+    """Print rows/sec per table and save the numbers for comparing batch sizes and worker counts."""
+    print(f"{'table':<28} {'rows':>10} {'seconds':>9} {'rows/s':>12}")
+    for table, stats in results.items():
+        if stats['success']:
+            print(f"{table:<28} {stats['rows']:>10} {stats['seconds']:>9.2f} {stats['rows_per_sec'] or 0:>12.1f}")
+        else:
+            print(f"{table:<28} failed: {stats['error']}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'target': target.name, 'load_workers': etl_settings.ETL_LOAD_WORKERS,
+                   'chunk_size': etl_settings.ETL_CHUNK_SIZE, 'tables': results}, f, indent=2)
+    logging.info(f"Load report saved to {path}")
 
-def main():
+def main(incremental=etl_settings.ETL_INCREMENTAL):
     logging.info("Starting ETL process...")
 
     try:
-        logging.info("Extracting data from SQLite...")
-        extracted_data = extract_from_sqlite()
-
-        logging.info("Transforming data...")
-        transformed_data = transform_data(extracted_data)
+        logging.info("Extracting and transforming data from SQLite into staged files...")
+        watermarks = load_watermarks() if incremental else None
+        staged_data, new_watermarks, full_tables = stage_from_sqlite(watermarks)
 
-        logging.info("Loading data to Snowflake...")
-        load_to_snowflake(transformed_data)
+        target = create_target()
+        logging.info(f"Loading data to {target.name}...")
+        results = load_tables(staged_data, target, overwrite_tables=full_tables if incremental else ())
+        write_load_report(results, target)
+        if incremental:
+            # Only advance the watermarks of tables that made it into the warehouse
+            watermarks.update({table: value for table, value in new_watermarks.items() if results[table]['success']})
+            save_watermarks(watermarks)
+            logging.info(f"Watermarks saved to {etl_state_file}")
 
         logging.info("ETL process completed successfully.")
     except Exception as e:
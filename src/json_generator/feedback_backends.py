@@ -0,0 +1,239 @@
+'''
+Text backends for the free-text client feedback answers (Q3, Q4).
+
+A request is (tone, satisfaction score, communication score, question ID).
+TemplateFeedbackBackend composes answers from phrase banks on the CPU.
+LLMFeedbackBackend prompts a Hugging Face chat model. It deduplicates requests by key,
+generates a few variants per key in batches, and caches them on disk for later runs.
+'''
+import os
+import re
+import json
+from config.path_config import cache_path
+from config import generation_settings
+
+TONES = [
+    #"Formal: Respond in a formal and professional manner.",
+    "Casual: Respond in a casual and friendly manner.",
+    "Enthusiastic: Respond with enthusiasm and excitement.",
+    "Sympathetic: Respond with sympathy and understanding.",
+    #"Direct: Respond in a direct and concise manner.",
+    "Inquisitive: Respond with curiosity, asking questions.",
+    #"Supportive: Respond in a supportive and encouraging manner.",
+    "Humorous: Respond with humor and a light-hearted tone.",
+    "Skeptical: Respond with skepticism and caution.",
+    #"Empathetic: Respond with empathy and reassurance.",
+    "Optimistic: Respond with optimism and positivity.",
+    "Pessimistic: Respond with caution and a hint of doubt.",
+    "Authoritative: Respond with confidence and authority.",
+    "Reflective: Respond with thoughtfulness and introspection.",
+    "Urgent: Respond with a sense of urgency and importance.",
+    "Encouraging: Respond with encouragement and motivation."
+]
+
+QUESTIONS = {
+    'Q3': "What did you like best about working with us?",
+    'Q4': "What could we improve on?"
+}
+
+
+def score_level(score):
+    return 'low' if score <= 2 else 'mid' if score == 3 else 'high'
+
+
+class TemplateFeedbackBackend:
+    '''
+    Answers built from phrase banks: Q3 praises the better-rated aspect (outcome or
+    communication), Q4 picks on the worse one, and the tone adds an opener and closer.
+    '''
+    name = 'template'
+
+    LIKED = {
+        'outcome': {
+            'high': ["the final deliverables went beyond what we expected",
+                     "we got exactly the outcome we were after",
+                     "the results are already making a difference for our team",
+                     "the recommendations were practical and easy to act on"],
+            'mid': ["the core deliverables covered what we needed",
+                    "the project delivered what we asked for",
+                    "the analysis gave us a solid starting point"],
+            'low': ["a few of the deliverables were useful to us",
+                    "the early analysis had some good ideas",
+                    "the team put real effort in"]
+        },
+        'communication': {
+            'high': ["your team kept us informed at every step",
+                     "communication was clear, quick and proactive",
+                     "we always knew where the project stood"],
+            'mid': ["status updates were fairly regular",
+                    "the team was reachable when we needed them",
+                    "meetings were well organised"],
+            'low': ["the kickoff set clear expectations",
+                    "individual consultants were friendly when we reached them",
+                    "the final presentation was well put together"]
+        }
+    }
+    IMPROVE = {
+        'outcome': {
+            'high': ["honestly not much, maybe a bit more detail in the final report",
+                     "earlier drafts of the deliverables would have been nice",
+                     "a short handover session at the end would round it off"],
+            'mid': ["the later deliverables needed tighter deadlines",
+                    "the recommendations could be more specific to our business",
+                    "some deliverables needed a second pass"],
+            'low': ["the deliverables needed far more rework than we expected",
+                    "the outcome did not match the scope we agreed",
+                    "the quality of the final work has to improve"]
+        },
+        'communication': {
+            'high': ["a single shared status page would make things even easier",
+                     "slightly fewer meetings would free up our team",
+                     "nothing major, just keep the updates coming"],
+            'mid': ["updates between milestones were sometimes thin",
+                    "we would like a clearer escalation path",
+                    "meeting notes could be shared faster"],
+            'low': ["we often had to chase the team for updates",
+                    "changes were not communicated until late",
+                    "questions went unanswered for days"]
+        }
+    }
+    TONE_STYLES = {
+        'Casual': (["Honestly, ", "To be fair, ", ""], ["."]),
+        'Enthusiastic': (["Wow, ", "Really happy to say ", ""], ["!", "!!"]),
+        'Sympathetic': (["We understand projects are hard, but ", "We know timelines were tight; ", ""], ["."]),
+        'Inquisitive': (["We wonder if ", "Curious whether you noticed, but "], ["? Could we discuss it?", "?"]),
+        'Humorous': (["Not to be dramatic, but ", "Plot twist: "], [". Who knew!", " (no pun intended)."]),
+        'Skeptical': (["We are not fully convinced yet, but ", "Time will tell, but "], ["."]),
+        'Optimistic': (["Looking ahead, ", "On the bright side, "], [", and we expect even better next time."]),
+        'Pessimistic': (["We are not sure it will last, but ", "Hard to say, but "], ["."]),
+        'Authoritative': (["Clearly, ", "Without question, "], ["."]),
+        'Reflective': (["Looking back, ", "Thinking it over, "], ["."]),
+        'Urgent': (["Most importantly, ", "First and foremost, "], [", and this matters right away."]),
+        'Encouraging': (["Keep it up: ", "Great foundation here: "], [". Keep going!"])
+    }
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def respond(self, requests):
+        return [self.compose(*request) for request in requests]
+
+    def compose(self, tone, satisfaction, communication, question_id):
+        scores = {'outcome': satisfaction, 'communication': communication}
+        if question_id == 'Q3':
+            aspect = max(scores, key=scores.get) if satisfaction != communication else self.rng.choice(list(scores))
+            body = self.rng.choice(self.LIKED[aspect][score_level(scores[aspect])])
+        else:
+            aspect = min(scores, key=scores.get) if satisfaction != communication else self.rng.choice(list(scores))
+            body = self.rng.choice(self.IMPROVE[aspect][score_level(scores[aspect])])
+
+        openers, closers = self.TONE_STYLES.get(tone.split(':')[0], ([""], ["."]))
+        text = self.rng.choice(openers) + body + self.rng.choice(closers)
+        return text[0].upper() + text[1:]
+
+
+class LLMFeedbackBackend:
+    '''
+    Chat-model answers, deduplicated by request key and cached in cache_path, so every
+    (tone, scores, question) combination is generated once across projects and runs.
+    '''
+    name = 'llm'
+
+    def __init__(self, rng, model_id=generation_settings.FEEDBACK_LLM_MODEL,
+                 variants=generation_settings.FEEDBACK_LLM_VARIANTS,
+                 batch_size=generation_settings.FEEDBACK_LLM_BATCH_SIZE):
+        self.rng = rng
+        self.model_id = model_id
+        self.variants = variants
+        self.batch_size = batch_size
+        self.cache_file = os.path.join(cache_path, f"feedback_{re.sub(r'[^A-Za-z0-9]+', '_', model_id)}.json")
+        self.cache = self.load_cache()
+        self.pipeline = None
+
+    def load_cache(self):
+        if not os.path.exists(self.cache_file):
+            return {}
+        with open(self.cache_file, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_cache(self):
+        os.makedirs(cache_path, exist_ok=True)
+        temp_path = f"{self.cache_file}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.cache_file)
+
+    def load_pipeline(self):
+        # Heavy imports only when something actually has to be generated
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+
+        access_token = os.getenv('HF_TOKEN')
+        tokenizer = AutoTokenizer.from_pretrained(self.model_id, token=access_token, padding_side='left')
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        model = AutoModelForCausalLM.from_pretrained(self.model_id, token=access_token, torch_dtype=torch.bfloat16)
+        device = generation_settings.FEEDBACK_LLM_DEVICE
+        self.pipeline = pipeline("text-generation", model=model, tokenizer=tokenizer,
+                                 device=int(device) if device.isdigit() else device)
+
+    @staticmethod
+    def cache_key(tone, satisfaction, communication, question_id):
+        return f"{tone}|{satisfaction}|{communication}|{question_id}"
+
+    @staticmethod
+    def build_prompt(tone, satisfaction, communication, question_id):
+        return [
+            {"role": "system", "content": f"{tone} Assume you are a client (you represent your company so use 'we' sometimes instead of 'I') of a completed consulting project, please generate a short sentence of feedbck reflecting scores {satisfaction} out of 5 for satisfaction and {communication} out of 5 for communication."},
+            {"role": "user", "content": f"{QUESTIONS[question_id]} (Be natural, simple, and concise, do not always start with 'while' or 'we appreciate')"},
+        ]
+
+    @staticmethod
+    def clean(generated):
+        # Extract the assistant's content
+        assistant_content = generated[0]['generated_text'][-1]['content']
+        cleaned_content = re.sub(r'[\\]', '', assistant_content)  # Remove backslashes
+        return cleaned_content.strip('"')  # Remove outer quotes
+
+    def fill_cache(self, requests):
+        missing = sorted({self.cache_key(*request): request for request in requests
+                          if len(self.cache.get(self.cache_key(*request), [])) < self.variants}.items())
+        if not missing:
+            return
+        if self.pipeline is None:
+            self.load_pipeline()
+
+        jobs = [(key, request) for key, request in missing
+                for _ in range(self.variants - len(self.cache.get(key, [])))]
+        print(f"Generating {len(jobs)} feedback responses for {len(missing)} new prompt keys...")
+        for start in range(0, len(jobs), self.batch_size):
+            batch = jobs[start:start + self.batch_size]
+            outputs = self.pipeline(
+                [self.build_prompt(*request) for _, request in batch],
+                batch_size=self.batch_size,
+                max_new_tokens=100,
+                eos_token_id=self.pipeline.tokenizer.eos_token_id,
+                pad_token_id=self.pipeline.tokenizer.pad_token_id,
+                do_sample=True,
+                temperature=1.0,
+                top_p=0.9,
+            )
+            for (key, _), generated in zip(batch, outputs):
+                self.cache.setdefault(key, []).append(self.clean(generated))
+            # Keep finished batches if a later one fails
+            self.save_cache()
+
+    def respond(self, requests):
+        self.fill_cache(requests)
+        return [self.rng.choice(self.cache[self.cache_key(*request)]) for request in requests]
+
+
+FEEDBACK_BACKENDS = {
+    'template': TemplateFeedbackBackend,
+    'llm': LLMFeedbackBackend
+}
+
+def create_feedback_backend(rng, name=generation_settings.FEEDBACK_BACKEND):
+    if name not in FEEDBACK_BACKENDS:
+        raise ValueError(f"Unknown FEEDBACK_BACKEND '{name}'. Expected one of: {', '.join(FEEDBACK_BACKENDS)}")
+    return FEEDBACK_BACKENDS[name](rng)
@@ -1,7 +1,9 @@
 import sys
 import os
+from functools import partial
+from sqlalchemy.orm import sessionmaker
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from models.db_model import main as create_db
+from models.db_model import main as create_db, create_indexes, persist_database, engine
 from database_generator.generators.client import generate_clients
 from database_generator.generators.location import generate_locations
 from database_generator.generators.title import generate_titles
@@ -9,27 +11,42 @@ from database_generator.generators.business_unit import generate_business_units
 from database_generator.generators.consultant_title_history import main as generate_consultant_title_history
 from database_generator.generators.payroll import generate_payroll
 from database_generator.generators.project_deliverable import generate_projects
+from database_generator.generators.project_shards import generate_projects_sharded
+from database_generator.utils.random_streams import set_seed
+from database_generator.utils.instrumentation import instrumentation
+from database_generator.utils.checkpoint import has_checkpoint
+from database_generator.utils.consultant_utils import last_simulated_year, active_headcount
+from config import project_settings, generation_settings
+from config.path_config import instrumentation_path
 from spreadsheet_generator.indirect_cost import generate_indirect_costs
 from spreadsheet_generator.non_billable_time import generate_non_billable_time_report
-#from json_generator.client_feedback import generate_client_feedback
+from json_generator.client_feedback import generate_client_feedback
 
 START_YEAR = 2015
 END_YEAR = 2015
 INITIAL_CONSULTANTS = 100
+NUM_CLIENTS = 358
 
-def main():
-    # Initialize DB
-    create_db()
-
-    # Generate database
+def generate_reference_data():
     generate_locations()
     generate_business_units()
-    generate_clients(358)
+    generate_clients(NUM_CLIENTS)
     generate_titles()
-    generate_consultant_title_history(INITIAL_CONSULTANTS, start_year=START_YEAR, end_year=END_YEAR)
-    generate_payroll(END_YEAR)
-    generate_projects(START_YEAR, END_YEAR, INITIAL_CONSULTANTS)
-    
+
+def simulate_projects(start_year, end_year, initial_consultants, resume=False, extend=False):
+    # Deferred indexes (see db_settings): lookups used by the simulation first,
+    # the timesheet index once its rows are in
+    create_indexes(exclude=['Consultant_Deliverable'])
+    if resume or extend:
+        # Checkpoints and carried-over projects are only handled by the single-process simulation
+        generate_projects(start_year, end_year, initial_consultants, resume=resume)
+    elif project_settings.SIMULATION_WORKERS > 1:
+        generate_projects_sharded(start_year, end_year, initial_consultants)
+    else:
+        generate_projects(start_year, end_year, initial_consultants)
+    create_indexes()
+
+def generate_reports():
     # Generate Spreadsheet
     generate_indirect_costs()
 
@@ -37,7 +54,77 @@ def main():
     generate_non_billable_time_report()
 
     # Generate json file
-    #generate_client_feedback()
+    generate_client_feedback()
+
+def build_phases(start_year=START_YEAR, end_year=END_YEAR, initial_consultants=INITIAL_CONSULTANTS, resume=False):
+    '''
+    Ordered (name, callable) steps of a full generation run. A resumed run keeps the
+    existing database and picks the project simulation up from its checkpoint.
+    '''
+    if resume:
+        return [
+            ('project_simulation', partial(simulate_projects, start_year, end_year, initial_consultants, resume=True)),
+            ('persist_database', persist_database),
+            ('reports', generate_reports)
+        ]
+    return [
+        ('create_db', create_db),
+        ('reference_data', generate_reference_data),
+        ('consultant_history', partial(generate_consultant_title_history, initial_consultants, start_year=start_year, end_year=end_year)),
+        ('payroll', partial(generate_payroll, end_year)),
+        ('project_simulation', partial(simulate_projects, start_year, end_year, initial_consultants)),
+        ('persist_database', persist_database),
+        ('reports', generate_reports)
+    ]
+
+def build_extension_phases(years):
+    '''
+    Steps that append years to the existing database: the consultants still employed,
+    their open title records, open projects and workloads all carry over, and only the
+    new years are simulated.
+    '''
+    session = sessionmaker(bind=engine)()
+    try:
+        last_year = last_simulated_year(session)
+        headcount = active_headcount(session)
+    finally:
+        session.close()
+    if last_year is None:
+        raise ValueError("EXTEND_YEARS needs an existing database; run a full generation first")
+
+    start_year, end_year = last_year + 1, last_year + years
+    print(f"Extending the database from {last_year} through {end_year} ({headcount} active consultants)")
+    return [
+        ('consultant_history', partial(generate_consultant_title_history, headcount, start_year=start_year, end_year=end_year, extend=True)),
+        ('payroll', partial(generate_payroll, end_year, start_year=start_year)),
+        ('project_simulation', partial(simulate_projects, start_year, end_year, headcount, extend=True)),
+        ('persist_database', persist_database),
+        ('reports', generate_reports)
+    ]
+
+def main():
+    seed = set_seed(generation_settings.RANDOM_SEED)
+    print(f"Random seed: {seed}")
+
+    resume = generation_settings.RESUME and has_checkpoint(engine)
+    if generation_settings.RESUME and not resume:
+        print("RESUME is set but the database has no checkpoint; starting a new run")
+    elif resume:
+        print("Resuming the project simulation from the database checkpoint")
+
+    if resume:
+        phases = build_phases(resume=True)
+    elif generation_settings.EXTEND_YEARS:
+        phases = build_extension_phases(generation_settings.EXTEND_YEARS)
+    else:
+        phases = build_phases()
+
+    instrumentation.attach_engine(engine)
+    for name, run_phase in phases:
+        with instrumentation.phase(name):
+            run_phase()
+
+    instrumentation.write_report(instrumentation_path)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,13 +1,40 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, ForeignKey, Float, Boolean, PickleType, JSON
+import os
+from sqlalchemy import create_engine, event, Index, Column, Integer, String, Date, DateTime, ForeignKey, Float, Boolean, PickleType, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.mutable import MutableDict
+from sqlalchemy.pool import StaticPool
 from config.path_config import db_file_path
+from config import db_settings
 from datetime import datetime
 
 Base = declarative_base()
 
-engine = create_engine(f'sqlite:///{db_file_path}')
+def create_db_engine(path=db_file_path, profile=db_settings.ENGINE_PROFILE,
+                     in_memory=db_settings.IN_MEMORY_DATABASE, exclusive=db_settings.EXCLUSIVE_LOCKING):
+    pragmas = dict(db_settings.ENGINE_PROFILES[profile])
+    if exclusive:
+        pragmas['locking_mode'] = 'EXCLUSIVE'
+
+    if in_memory:
+        # A single shared connection keeps the in-memory database alive for the whole run
+        db_engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    elif exclusive:
+        db_engine = create_engine(f'sqlite:///{path}', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    else:
+        db_engine = create_engine(f'sqlite:///{path}')
+
+    if pragmas:
+        @event.listens_for(db_engine, 'connect')
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            cursor.close()
+
+    return db_engine
+
+engine = create_db_engine()
 
 class Title(Base):
     __tablename__ = 'Title'
@@ -46,6 +73,10 @@ class ConsultantTitleHistory(Base):
     Consultant = relationship("Consultant", back_populates="TitleHistory")
     Title = relationship("Title")
 
+    __table_args__ = (
+        Index('ix_title_history_consultant_start', 'ConsultantID', 'StartDate'),
+    )
+
 class Payroll(Base):
     __tablename__ = 'Payroll'
     PayRollID = Column(Integer, primary_key=True)
@@ -94,6 +125,10 @@ class Project(Base):
     Team = relationship("ProjectTeam", back_populates="Project")
     CustomData = relationship("ProjectCustomData", uselist=False, back_populates="Project")
 
+    __table_args__ = (
+        Index('ix_project_status_start', 'Status', 'ActualStartDate'),
+    )
+
 
 class ProjectTeam(Base):
     __tablename__ = 'ProjectTeam'
@@ -106,6 +141,11 @@ class ProjectTeam(Base):
     Project = relationship("Project", back_populates="Team")
     Consultant = relationship("Consultant")
 
+    __table_args__ = (
+        Index('ix_project_team_consultant_end', 'ConsultantID', 'EndDate'),
+        Index('ix_project_team_project_consultant', 'ProjectID', 'ConsultantID'),
+    )
+
 class Deliverable(Base):
     __tablename__ = 'Deliverable'
     DeliverableID = Column(Integer, primary_key=True)
@@ -124,6 +164,10 @@ class Deliverable(Base):
     Project = relationship("Project", back_populates="Deliverables")
     ConsultantDeliverables = relationship("ConsultantDeliverable", back_populates="Deliverable")
 
+    __table_args__ = (
+        Index('ix_deliverable_project', 'ProjectID'),
+    )
+
 class ProjectBillingRate(Base):
     __tablename__ = 'ProjectBillingRate'
     BillingRateID = Column(Integer, primary_key=True)
@@ -143,6 +187,10 @@ class ConsultantDeliverable(Base):
     Consultant = relationship("Consultant")
     Deliverable = relationship("Deliverable")
 
+    __table_args__ = (
+        Index('ix_consultant_deliverable_consultant_date', 'ConsultantID', 'Date'),
+    )
+
 class ProjectExpense(Base):
     __tablename__ = 'ProjectExpense'
     ProjectExpenseID = Column(Integer, primary_key=True)
@@ -168,9 +216,60 @@ class ProjectCustomData(Base):
     CustomData = Column(JSON)
     Project = relationship("Project", back_populates="CustomData")
 
-def create_database():
-    Base.metadata.drop_all(engine)
+class SimulationCheckpoint(Base):
+    __tablename__ = 'SimulationCheckpoint'
+    ID = Column(Integer, primary_key=True)
+    Mode = Column(String)
+    StartYear = Column(Integer)
+    Year = Column(Integer)
+    Month = Column(Integer)
+    State = Column(JSON)
+
+def create_database(defer_indexes=db_settings.DEFER_INDEX_CREATION):
+    if engine.url.database:
+        # Start from a new file instead of dropping tables, so free pages and counters
+        # from a previous run don't carry over into this one
+        engine.dispose()
+        for suffix in ('', '-journal', '-wal', '-shm'):
+            if os.path.exists(engine.url.database + suffix):
+                os.remove(engine.url.database + suffix)
+    else:
+        Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)
+    # create_all emits indexes in set order; rebuild them in name order so the file
+    # is laid out the same way on every run. Deferred indexes are rebuilt by
+    # create_indexes() once the bulk load is done.
+    drop_indexes()
+    if not defer_indexes:
+        create_indexes()
+
+def create_indexes(bind=None, exclude=()):
+    for table in Base.metadata.sorted_tables:
+        if table.name in exclude:
+            continue
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            index.create(bind or engine, checkfirst=True)
+
+def drop_indexes(bind=None):
+    for table in Base.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            index.drop(bind or engine, checkfirst=True)
+
+def persist_database(path=db_file_path):
+    '''
+    Write the finished database out compactly. VACUUM rebuilds the file from its
+    contents, so the same data always produces the same bytes; an in-memory
+    database is written to path with VACUUM INTO.
+    '''
+    print(f"Compacting database to {path}...")
+    with engine.connect() as connection:
+        if engine.url.database:
+            connection.exec_driver_sql('VACUUM')
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            connection.exec_driver_sql('VACUUM INTO ?', (path,))
+    print("Complete")
 
 def main():
     print("Creating Database...")
@@ -5,16 +5,17 @@ import random
 from datetime import datetime, timedelta
 from sqlalchemy.orm import sessionmaker
 from models.db_model import Project, engine
-from config.path_config import indirect_costs_path
+from config.path_config import indirect_costs_path, REPORT_FORMAT
+from .report_writer import write_report
 
 def generate_indirect_costs(mean_labor_cost=125000, stddev_labor_cost=5000, mean_other_expense=30000, stddev_other_expense=3000, 
                             outlier_probability=0.01, outlier_multiplier_range=(1.1, 1.3), base_inflation_rate=0.005, 
                             inflation_fluctuation_range=(-0.0005, 0.0005), seasonality_amplitude=0.05, 
                             dependency_factor=0.5, initial_cost_multiplier=2, business_unit_buffer_days=30, 
-                            random_seed=42):
-    # Set the seed for reproducibility
-    random.seed(random_seed)
-    np.random.seed(random_seed)
+                            random_seed=42, output_path=indirect_costs_path, fmt=REPORT_FORMAT):
+    # Local generators seeded for reproducibility, leaving the global random state alone
+    rng = random.Random(random_seed)
+    np_rng = np.random.RandomState(random_seed)
 
     Session = sessionmaker(bind=engine)
     session = Session()
@@ -27,7 +28,7 @@ def generate_indirect_costs(mean_labor_cost=125000, stddev_labor_cost=5000, mean
     most_recent_date = most_recent_date.replace(day=1) + pd.DateOffset(months=1) - pd.DateOffset(days=1)
 
     # Define the months based on the project dates
-    months = pd.date_range(start=earliest_date, end=most_recent_date, freq='M')
+    months = pd.date_range(start=earliest_date, end=most_recent_date, freq='ME')
 
     # Define business units and their corresponding multipliers
     business_units = {
@@ -56,7 +57,7 @@ def generate_indirect_costs(mean_labor_cost=125000, stddev_labor_cost=5000, mean
 
     for i, month in enumerate(months):
         # Apply a fluctuating inflation rate
-        inflation_adjustment = random.uniform(*inflation_fluctuation_range)
+        inflation_adjustment = rng.uniform(*inflation_fluctuation_range)
         current_inflation_rate += inflation_adjustment
 
         for unit, start_date in business_units_start_dates.items():
@@ -72,8 +73,8 @@ def generate_indirect_costs(mean_labor_cost=125000, stddev_labor_cost=5000, mean
             # Calculate seasonality factor
             seasonality_factor = seasonality(i)
 
-            labor_costs = np.random.normal(adjusted_mean_labor_cost, stddev_labor_cost)
-            other_expenses = np.random.normal(adjusted_mean_other_expense, stddev_other_expense)
+            labor_costs = np_rng.normal(adjusted_mean_labor_cost, stddev_labor_cost)
+            other_expenses = np_rng.normal(adjusted_mean_other_expense, stddev_other_expense)
 
             # Ensure costs are not negative
             labor_costs = max(labor_costs, 0)
@@ -96,8 +97,8 @@ def generate_indirect_costs(mean_labor_cost=125000, stddev_labor_cost=5000, mean
             previous_other_expenses[unit] = other_expenses
 
             # Apply a chance of an outlier
-            if random.random() < outlier_probability:
-                outlier_multiplier = random.uniform(*outlier_multiplier_range)
+            if rng.random() < outlier_probability:
+                outlier_multiplier = rng.uniform(*outlier_multiplier_range)
                 labor_costs *= outlier_multiplier
                 other_expenses *= outlier_multiplier
 
@@ -110,9 +111,9 @@ def generate_indirect_costs(mean_labor_cost=125000, stddev_labor_cost=5000, mean
     # Create DataFrame
     df = pd.DataFrame(data, columns=["Month", "Business Unit ID", "Non-proj Labor Costs", "Other Expense Costs", "Total Indirect Costs"])
 
-    # Save DataFrame to Excel
-    df.to_excel(indirect_costs_path, index=False)
-    print(f"Data saved to {indirect_costs_path}")
+    # Save DataFrame in the configured report format
+    write_report(df, output_path, fmt)
+    print(f"Data saved to {output_path}")
 
     session.close()
 
@@ -0,0 +1,113 @@
+import pandas as pd
+from openpyxl import Workbook
+from config.path_config import REPORT_EXTENSIONS
+
+# Excel caps a worksheet at 1,048,576 rows including the header
+XLSX_MAX_ROWS = 1048576
+
+
+class XlsxReportWriter:
+    '''
+    Write-only openpyxl workbook. Rows are streamed to disk as they are appended, and a
+    new sheet is started when the current one reaches the Excel row limit.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+
+    def _new_sheet(self, columns):
+        self.sheet = self.workbook.create_sheet(f'Sheet{len(self.workbook.worksheets) + 1}')
+        self.sheet.append(list(columns))
+        self.sheet_rows = 1
+
+    def write(self, df):
+        if self.sheet is None:
+            self._new_sheet(df.columns)
+        for row in df.itertuples(index=False, name=None):
+            if self.sheet_rows >= XLSX_MAX_ROWS:
+                self._new_sheet(df.columns)
+            self.sheet.append([None if pd.isna(value) else value for value in row])
+            self.sheet_rows += 1
+
+    def close(self):
+        if not self.workbook.worksheets:
+            self.workbook.create_sheet('Sheet1')
+        self.workbook.save(self.path)
+
+
+class CsvReportWriter:
+    def __init__(self, path):
+        self.path = path
+        self.header_written = False
+
+    def write(self, df):
+        df.to_csv(self.path, mode='a' if self.header_written else 'w', header=not self.header_written, index=False)
+        self.header_written = True
+
+    def close(self):
+        if not self.header_written:
+            open(self.path, 'w').close()
+
+
+class ArrowReportWriter:
+    '''
+    Parquet or Arrow IPC file writer. The schema is fixed by the first chunk written.
+    '''
+    def __init__(self, path, fmt):
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ImportError(f"pyarrow is required to write {fmt} reports (pip install pyarrow)") from e
+        self.pa = pyarrow
+        self.path = path
+        self.fmt = fmt
+        self.writer = None
+        self.schema = None
+
+    def write(self, df):
+        table = self.pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        if self.writer is None:
+            self.schema = table.schema
+            if self.fmt == 'parquet':
+                import pyarrow.parquet as pq
+                self.writer = pq.ParquetWriter(self.path, self.schema)
+            else:
+                import pyarrow.ipc as ipc
+                self.writer = ipc.new_file(self.path, self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_report_writer(path, fmt):
+    if fmt == 'xlsx':
+        writer = XlsxReportWriter(path)
+    elif fmt == 'csv':
+        writer = CsvReportWriter(path)
+    elif fmt in ('parquet', 'arrow'):
+        writer = ArrowReportWriter(path, fmt)
+    else:
+        raise ValueError(f"Unknown report format '{fmt}'. Expected one of: {', '.join(REPORT_EXTENSIONS)}")
+    return writer
+
+
+def write_report(chunks, path, fmt):
+    '''
+    Write a DataFrame, or an iterable of DataFrames with the same columns, to path.
+    Returns the number of rows written.
+    '''
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    writer = open_report_writer(path, fmt)
+    rows = 0
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            rows += len(chunk)
+    finally:
+        writer.close()
+    return rows
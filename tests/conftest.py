@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The generators import each other as top-level packages, as when running src/main.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
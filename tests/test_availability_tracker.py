@@ -0,0 +1,97 @@
+import random
+from datetime import date, timedelta
+from types import SimpleNamespace
+from database_generator.utils.consultant_utils import AvailabilityTracker, ConsultantState, ConsultantStateRegistry
+
+MAX_PROJECTS = {1: 2, 2: 2, 3: 3, 4: 3, 5: 2, 6: 2}
+
+
+def build(rng, consultant_count=60, days=365):
+    '''Random hires, promotions and departures over a year, as (date, consultant, title) events.'''
+    start = date(2015, 1, 1)
+    events = []
+    for number in range(consultant_count):
+        consultant_id = f'C{number:04d}'
+        day = start + timedelta(days=rng.randrange(days))
+        title_id = rng.randint(1, 5)
+        events.append((day, consultant_id, title_id))
+        if rng.random() < 0.4:
+            events.append((day + timedelta(days=rng.randrange(1, 120)), consultant_id, title_id + 1))
+        if rng.random() < 0.3:
+            events.append((day + timedelta(days=rng.randrange(121, 200)), consultant_id, None))
+    events.sort(key=lambda event: (event[0], event[1]))
+    consultant_ids = sorted({consultant_id for _, consultant_id, _ in events})
+    consultants = {consultant_id: SimpleNamespace(ConsultantID=consultant_id) for consultant_id in consultant_ids}
+    units = {consultant_id: rng.randint(1, 3) for consultant_id in consultant_ids}
+    registry = ConsultantStateRegistry({consultant_id: ConsultantState() for consultant_id in consultant_ids})
+    return AvailabilityTracker(registry, consultants, units, events), registry, events, units
+
+def employed_titles(events, current_date):
+    titles = {}
+    for day, consultant_id, title_id in events:
+        if day > current_date:
+            break
+        if title_id is None:
+            titles.pop(consultant_id, None)
+        else:
+            titles[consultant_id] = title_id
+    return titles
+
+def baseline_pick(registry, titles, title_id, count, exclude=(), max_projects=None):
+    '''The old selection: everyone with the title, sorted by (active projects, last project date).'''
+    candidates = sorted(
+        (consultant_id for consultant_id, title in titles.items() if title == title_id and consultant_id not in exclude),
+        key=lambda consultant_id: (registry[consultant_id].active_project_count,
+                                   registry[consultant_id].last_project_date or date.min, consultant_id))
+    if max_projects is not None:
+        candidates = [c for c in candidates if registry[c].active_project_count < max_projects]
+    return candidates[:count]
+
+
+def test_picks_match_sorting_the_employed_consultants():
+    rng = random.Random(25)
+    tracker, registry, events, units = build(rng)
+    current_date = date(2015, 1, 1)
+    for _ in range(120):
+        current_date += timedelta(days=rng.randint(1, 4))
+        tracker.advance(current_date)
+        titles = employed_titles(events, current_date)
+        assert tracker.titles == titles
+        if not titles:
+            continue
+
+        for consultant_id in rng.sample(sorted(titles), min(len(titles), 5)):
+            if rng.random() < 0.6:
+                registry.add_project(consultant_id, current_date)
+            else:
+                registry.remove_project(consultant_id, current_date)
+
+        for title_id in range(1, 7):
+            exclude = set(rng.sample(sorted(titles), min(len(titles), 3)))
+            count = rng.randint(1, 6)
+            max_projects = rng.choice([None, MAX_PROJECTS[title_id]])
+            picked = [c.ConsultantID for c in tracker.pick(title_id, count, exclude, max_projects)]
+            assert picked == baseline_pick(registry, titles, title_id, count, exclude, max_projects)
+            # Picking leaves the tracker unchanged
+            assert [c.ConsultantID for c in tracker.pick(title_id, count, exclude, max_projects)] == picked
+
+def test_counts_follow_the_title_history():
+    rng = random.Random(26)
+    tracker, registry, events, units = build(rng)
+    for current_date in (date(2015, 3, 1), date(2015, 9, 1), date(2016, 6, 1)):
+        tracker.advance(current_date)
+        titles = employed_titles(events, current_date)
+        for consultant_id in sorted(titles)[::4]:
+            registry.add_project(consultant_id, current_date)
+
+        for title_id in range(1, 7):
+            assert tracker.headcount[title_id] == sum(1 for title in titles.values() if title == title_id)
+        for max_title_id in (3, 6):
+            expected = {}
+            for consultant_id, title_id in titles.items():
+                if title_id <= max_title_id:
+                    expected[units[consultant_id]] = expected.get(units[consultant_id], 0) + 1
+            assert dict(tracker.unit_counts(max_title_id)) == expected
+        assert tracker.free_capacity(range(4, 7), MAX_PROJECTS) == sum(
+            max(0, MAX_PROJECTS[title_id] - registry.active_project_count(consultant_id))
+            for consultant_id, title_id in titles.items() if title_id >= 4)
@@ -0,0 +1,46 @@
+import sqlite3
+import pytest
+from etl_service import sqlite_to_snowflake
+from etl_service.load_targets import SQLiteTarget
+
+
+@pytest.fixture
+def source_db(tmp_path, monkeypatch):
+    path = tmp_path / 'source.db'
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE ProjectTeam (ID INTEGER PRIMARY KEY, ProjectID INTEGER, ConsultantID VARCHAR(10), '
+                       'StartDate DATE, EndDate DATE, Rate FLOAT, IsBillable BOOLEAN)')
+    # The first chunk has no end dates, rates or billable flags at all
+    connection.executemany('INSERT INTO ProjectTeam VALUES (?, ?, ?, ?, ?, ?, ?)', [
+        (1, 1, 'C0001', '2015-01-05', None, None, None),
+        (2, 1, 'C0002', '2015-01-05', None, None, None),
+        (3, 2, 'C0003', '2015-02-02', '2015-06-30', 120.5, 1),
+        (4, None, 'NA', '2015-02-02', '2015-07-31', 99.0, 0),
+    ])
+    connection.commit()
+    connection.close()
+    monkeypatch.setattr(sqlite_to_snowflake, 'SQLITE_DB_PATH', str(path))
+    return path
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet'])
+def test_chunks_keep_the_schema_dtypes(source_db, tmp_path, fmt):
+    if fmt == 'parquet':
+        pytest.importorskip('pyarrow')
+    _, paths, rows = sqlite_to_snowflake.stage_table('ProjectTeam', 'SELECT * FROM ProjectTeam', (),
+                                                     str(tmp_path / 'staging'), 2, fmt)
+    assert rows == 4 and len(paths) == 2
+
+    first, second = sqlite_to_snowflake.iter_frames(paths)
+    assert dict(first.dtypes.astype(str)) == dict(second.dtypes.astype(str)) == {
+        'ID': 'Int64', 'PROJECTID': 'Int64', 'CONSULTANTID': 'string', 'STARTDATE': 'string',
+        'ENDDATE': 'string', 'RATE': 'Float64', 'ISBILLABLE': 'boolean'
+    }
+    assert second['CONSULTANTID'].tolist() == ['C0003', 'NA']
+
+    target = SQLiteTarget(str(tmp_path / 'warehouse.db'))
+    results = sqlite_to_snowflake.load_tables({'ProjectTeam': paths}, target, overwrite_tables={'ProjectTeam'})
+    assert results['ProjectTeam']['success'] and results['ProjectTeam']['rows'] == 4
+    warehouse = sqlite3.connect(tmp_path / 'warehouse.db')
+    assert warehouse.execute('SELECT typeof(ENDDATE), typeof(RATE) FROM PROJECTTEAM WHERE ID = 3').fetchone() == ('text', 'real')
+    assert warehouse.execute('SELECT COUNT(*) FROM PROJECTTEAM WHERE ENDDATE IS NULL AND PROJECTID = 1').fetchone() == (2,)
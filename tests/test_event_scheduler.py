@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+from database_generator.utils.event_scheduler import (
+    EventScheduler, YEAR_START, MONTH_START, PROJECT_START, WORKDAY, DELIVERABLE_DUE, PROJECT_TIMEOUT, MONTH_END
+)
+
+
+def drain(scheduler):
+    events = []
+    while scheduler:
+        events.append(scheduler.pop())
+    return events
+
+
+def test_same_day_events_follow_the_daily_loop_order():
+    # run_daily_simulation: new year, new month, start projects, work, statuses, month end
+    scheduler = EventScheduler()
+    day = date(2015, 1, 1)
+    for kind in (MONTH_END, PROJECT_TIMEOUT, DELIVERABLE_DUE, WORKDAY, PROJECT_START, MONTH_START, YEAR_START):
+        scheduler.schedule(day, kind)
+    assert [kind for _, kind, _ in drain(scheduler)] == \
+        [YEAR_START, MONTH_START, PROJECT_START, WORKDAY, DELIVERABLE_DUE, PROJECT_TIMEOUT, MONTH_END]
+
+def test_dates_first_then_insertion_order():
+    scheduler = EventScheduler()
+    start = date(2015, 3, 1)
+    scheduler.schedule(start + timedelta(days=2), PROJECT_START, 7)
+    scheduler.schedule(start, DELIVERABLE_DUE, 3)
+    scheduler.schedule(start, DELIVERABLE_DUE, 1)
+    scheduler.schedule(start + timedelta(days=1), MONTH_END)
+    scheduler.schedule(start, DELIVERABLE_DUE, 2)
+    assert len(scheduler) == 5
+    assert drain(scheduler) == [
+        (start, DELIVERABLE_DUE, 3),
+        (start, DELIVERABLE_DUE, 1),
+        (start, DELIVERABLE_DUE, 2),
+        (start + timedelta(days=1), MONTH_END, None),
+        (start + timedelta(days=2), PROJECT_START, 7),
+    ]
+    assert not scheduler
@@ -0,0 +1,45 @@
+import random
+import pytest
+from json_generator.feedback_backends import (
+    TONES, QUESTIONS, TemplateFeedbackBackend, create_feedback_backend, score_level
+)
+
+
+def all_requests():
+    return [(tone, satisfaction, communication, question_id)
+            for tone in TONES for satisfaction in range(1, 6) for communication in range(1, 6)
+            for question_id in QUESTIONS]
+
+
+def test_one_answer_per_request_in_order():
+    # The old loop asked the model once per project and question; respond must line up the same way
+    backend = TemplateFeedbackBackend(random.Random(21))
+    requests = all_requests()
+    answers = backend.respond(requests)
+    assert len(answers) == len(requests)
+    for (tone, satisfaction, communication, question_id), answer in zip(requests, answers):
+        assert isinstance(answer, str) and answer.strip()
+        assert answer[0] == answer[0].upper()
+        banks = TemplateFeedbackBackend.LIKED if question_id == 'Q3' else TemplateFeedbackBackend.IMPROVE
+        assert any(phrase in answer.lower()
+                   for aspect, score in (('outcome', satisfaction), ('communication', communication))
+                   for phrase in banks[aspect][score_level(score)])
+
+def test_every_tone_has_a_style():
+    assert {tone.split(':')[0] for tone in TONES} <= set(TemplateFeedbackBackend.TONE_STYLES)
+
+def test_answers_follow_the_better_and_worse_aspect():
+    backend = TemplateFeedbackBackend(random.Random(5))
+    liked, improve = backend.respond([(TONES[0], 5, 1, 'Q3'), (TONES[0], 5, 1, 'Q4')])
+    assert any(phrase in liked.lower() for phrase in TemplateFeedbackBackend.LIKED['outcome']['high'])
+    assert any(phrase in improve.lower() for phrase in TemplateFeedbackBackend.IMPROVE['communication']['low'])
+
+def test_same_seed_same_answers():
+    requests = all_requests()[:200]
+    assert TemplateFeedbackBackend(random.Random(1)).respond(requests) == \
+        TemplateFeedbackBackend(random.Random(1)).respond(requests)
+
+def test_create_feedback_backend():
+    assert create_feedback_backend(random.Random(), 'template').name == 'template'
+    with pytest.raises(ValueError):
+        create_feedback_backend(random.Random(), 'gpt')
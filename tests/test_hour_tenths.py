@@ -0,0 +1,32 @@
+import random
+from decimal import Decimal
+from database_generator.utils.project_utils import to_tenths, from_tenths, round_decimal
+
+
+def test_to_tenths_rounds_like_round_decimal():
+    rng = random.Random(22)
+    draws = [rng.uniform(0.1, 12.0) for _ in range(20000)]
+    draws += [0.0, 0.05, 0.15, 0.25, 1.45, 2.675, 7.95, 7.999999999999999, 8.0]
+    for hours in draws:
+        rounded = round_decimal(Decimal(str(hours)), 1)
+        assert to_tenths(hours) == int(rounded * 10), hours
+        assert from_tenths(to_tenths(hours)) == float(rounded), hours
+
+def test_summed_tenths_match_the_decimal_running_total():
+    # Deliverable.ActualHours as the daily loop accumulated it before counting tenths
+    rng = random.Random(23)
+    actual_hours = 0.0
+    actual_tenths = 0
+    for _ in range(5000):
+        hours = round_decimal(Decimal(str(rng.uniform(2.0, 8.0))), 1)
+        actual_hours = float(round_decimal(Decimal(str(actual_hours)) + hours, 1))
+        actual_tenths += to_tenths(float(hours))
+        assert from_tenths(actual_tenths) == actual_hours
+
+def test_progress_matches_the_decimal_quotient():
+    rng = random.Random(24)
+    for _ in range(5000):
+        target_hours = float(round_decimal(Decimal(str(rng.uniform(10.0, 2000.0))), 1))
+        actual_hours = float(round_decimal(Decimal(str(rng.uniform(0.0, target_hours * 1.2))), 1))
+        baseline = min(100, int((Decimal(str(actual_hours)) / Decimal(str(target_hours))) * 100))
+        assert min(100, to_tenths(actual_hours) * 100 // to_tenths(target_hours)) == baseline
@@ -0,0 +1,48 @@
+from datetime import date
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from database_generator.generators.payroll import expand_monthly_pay_dates
+
+
+def baseline_pay_dates(start_date, end_date):
+    '''The per-record loop generate_payroll used before it was vectorised.'''
+    pay_dates = []
+    current_date = start_date
+    while current_date <= end_date:
+        pay_dates.append(current_date)
+        current_date += relativedelta(months=1)
+    return pay_dates
+
+def expand(ranges):
+    start_dates = np.array([start for start, _ in ranges], dtype='datetime64[D]')
+    end_dates = np.array([end for _, end in ranges], dtype='datetime64[D]')
+    pay_dates, range_index = expand_monthly_pay_dates(start_dates, end_dates)
+    expanded = [[] for _ in ranges]
+    for pay_date, index in zip(pay_dates.astype(object), range_index):
+        expanded[index].append(pay_date)
+    return expanded
+
+
+def test_month_end_starts_stay_clamped_like_the_loop():
+    ranges = [
+        (date(2015, 1, 31), date(2015, 12, 31)),
+        (date(2015, 1, 30), date(2015, 4, 29)),
+        (date(2016, 1, 29), date(2017, 3, 31)),
+        (date(2015, 3, 31), date(2015, 6, 30)),
+        (date(2015, 1, 31), date(2015, 3, 28)),
+    ]
+    assert expand(ranges) == [baseline_pay_dates(start, end) for start, end in ranges]
+
+def test_empty_and_single_day_ranges():
+    ranges = [
+        (date(2015, 5, 10), date(2015, 5, 9)),
+        (date(2015, 5, 10), date(2015, 5, 10)),
+        (date(2015, 5, 10), date(2015, 6, 9)),
+    ]
+    assert expand(ranges) == [[], [date(2015, 5, 10)], [date(2015, 5, 10)]]
+
+def test_matches_the_loop_for_every_start_day():
+    rng = np.random.default_rng(0)
+    starts = [date(2015, 1, 1) + relativedelta(days=int(offset)) for offset in rng.integers(0, 3 * 365, 400)]
+    ranges = [(start, start + relativedelta(days=int(length))) for start, length in zip(starts, rng.integers(0, 900, 400))]
+    assert expand(ranges) == [baseline_pay_dates(start, end) for start, end in ranges]
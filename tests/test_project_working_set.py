@@ -0,0 +1,39 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import flag_modified
+from models.db_model import Base, ProjectCustomData
+from database_generator.utils.project_working_set import ProjectWorkingSet
+
+
+def make_session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_added_team_members_reach_the_working_set_and_the_database():
+    session = make_session()
+    working_set = ProjectWorkingSet().bind(session)
+    session.add(ProjectCustomData(ProjectID=1, CustomData={'team': ['C0001'], 'target_hours': 100, 'deliverables': {}}))
+    session.commit()
+    assert working_set.get(session, 1).team == ['C0001']
+
+    # What update_project_team does to the JSON column
+    project_custom_data = session.get(ProjectCustomData, 1)
+    current_team = project_custom_data.CustomData.get('team', [])
+    current_team.append('C0002')
+    project_custom_data.CustomData['team'] = current_team
+    flag_modified(project_custom_data, 'CustomData')
+    working_set.set_team(1, current_team)
+
+    assert working_set.get(session, 1).team == ['C0001', 'C0002']
+    session.commit()
+    session.expire_all()
+    assert session.get(ProjectCustomData, 1).CustomData['team'] == ['C0001', 'C0002']
+
+
+def test_set_team_leaves_untracked_projects_to_load():
+    session = make_session()
+    working_set = ProjectWorkingSet().bind(session)
+    working_set.set_team(2, ['C0003'])
+    assert 2 not in working_set.projects
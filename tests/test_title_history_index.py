@@ -0,0 +1,45 @@
+import random
+from datetime import date, timedelta
+from models.db_model import ConsultantTitleHistory
+from database_generator.utils.consultant_utils import TitleHistoryIndex
+
+
+def baseline_open_record(title_history_data, consultant_id):
+    '''The reversed scan consultant_title_history used before the index.'''
+    return next((th for th in reversed(title_history_data)
+                 if th.ConsultantID == consultant_id and th.EndDate is None), None)
+
+
+def test_lookups_match_scanning_the_flat_list():
+    rng = random.Random(7)
+    index = TitleHistoryIndex()
+    title_history_data = []
+    consultant_ids = [f'C{number:04d}' for number in range(1, 21)]
+    day = date(2015, 1, 1)
+
+    for consultant_id in consultant_ids:
+        record = ConsultantTitleHistory(ConsultantID=consultant_id, TitleID=1, StartDate=day, EventType='Hire')
+        title_history_data.append(index.append(record))
+
+    for _ in range(300):
+        day += timedelta(days=1)
+        consultant_id = rng.choice(consultant_ids)
+        current = index.open_record(consultant_id)
+        assert current is baseline_open_record(title_history_data, consultant_id)
+        if current is None:
+            continue
+        closed = index.close(consultant_id, day - timedelta(days=1))
+        assert closed is current and closed.EndDate == day - timedelta(days=1)
+        if rng.random() < 0.8:
+            record = ConsultantTitleHistory(ConsultantID=consultant_id, TitleID=min(6, current.TitleID + 1),
+                                            StartDate=day, EventType='Promotion')
+        else:
+            record = ConsultantTitleHistory(ConsultantID=consultant_id, TitleID=current.TitleID,
+                                            StartDate=day, EndDate=day, EventType='Layoff')
+        title_history_data.append(index.append(record))
+
+    assert index.all_records == title_history_data
+    assert len(index) == len(title_history_data)
+    for consultant_id in consultant_ids + ['C9999']:
+        assert index.open_record(consultant_id) is baseline_open_record(title_history_data, consultant_id)
+        assert index.for_consultant(consultant_id) == [th for th in title_history_data if th.ConsultantID == consultant_id]